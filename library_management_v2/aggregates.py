@@ -0,0 +1,99 @@
+import heapq
+
+
+class RankedCounter:
+    # a count per key, with the keys grouped in a bucket per count, so changing a count by one is O(1)
+    # and the keys with the highest counts are read from the top bucket down
+    def __init__(self):
+        self.counts = {}
+        self.buckets = {}
+        self.highest = 0
+
+    def add(self, key, amount=1):
+        old = self.counts.get(key, 0)
+        new = old + amount
+        if old:
+            self.buckets[old].discard(key)
+            if not self.buckets[old]:
+                del self.buckets[old]
+        if new > 0:
+            self.counts[key] = new
+            self.buckets.setdefault(new, set()).add(key)
+            self.highest = max(self.highest, new)
+        else:
+            self.counts.pop(key, None)
+        while self.highest and self.highest not in self.buckets:
+            self.highest -= 1
+
+    def get(self, key):
+        return self.counts.get(key, 0)
+
+    def top(self, limit=10):
+        # (key, count) pairs, highest count first and keys in order within a count
+        result = []
+        count = self.highest
+        while count and len(result) < limit:
+            bucket = self.buckets.get(count)
+            if bucket:
+                # only as many keys as still fit, without sorting a large bucket
+                for key in heapq.nsmallest(limit - len(result), bucket):
+                    result.append((key, count))
+            count -= 1
+        return result
+
+
+class Aggregates:
+    # inventory figures kept up to date on every change instead of scanning book_dict and rentals_dict
+    def __init__(self):
+        self.out_of_stock = set()
+        # copies on the shelves per author, ranked like the loans for the inventory report
+        self.author_copies = RankedCounter()
+        self.author_titles = {}
+        # books on loan per student id and copies on loan per book id
+        self.student_loans = RankedCounter()
+        self.book_loans = RankedCounter()
+
+    @classmethod
+    def build(cls, book_dict, rentals_dict):
+        aggregates = cls()
+        for book_id, book in book_dict.items():
+            aggregates.add_book(book_id, book)
+        for (student_name, student_id), book_ids in rentals_dict.items():
+            for book_id in book_ids:
+                aggregates.add_loan(student_id, book_id)
+        return aggregates
+
+    def add_book(self, book_id, book):
+        author = book['author']
+        self.author_titles[author] = self.author_titles.get(author, 0) + 1
+        self.author_copies.add(author, int(book['quantity']))
+        if int(book['quantity']) <= 0:
+            self.out_of_stock.add(book_id)
+
+    def remove_book(self, book_id, book):
+        author = book['author']
+        self.author_titles[author] -= 1
+        self.author_copies.add(author, -int(book['quantity']))
+        if not self.author_titles[author]:
+            del self.author_titles[author]
+        self.out_of_stock.discard(book_id)
+
+    def change_quantity(self, book_id, book, delta):
+        # book already holds the new quantity
+        self.author_copies.add(book['author'], delta)
+        if int(book['quantity']) <= 0:
+            self.out_of_stock.add(book_id)
+        else:
+            self.out_of_stock.discard(book_id)
+
+    def add_loan(self, student_id, book_id):
+        self.student_loans.add(student_id)
+        self.book_loans.add(book_id)
+
+    def remove_loan(self, student_id, book_id):
+        self.student_loans.add(student_id, -1)
+        self.book_loans.add(book_id, -1)
+
+    def clear_loans(self):
+        self.student_loans = RankedCounter()
+        self.book_loans = RankedCounter()
@@ -0,0 +1,234 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # peak memory is only reported where the resource module exists
+    resource = None
+
+from library import Library
+from records import Book
+from storage import STORAGES, migrate, open_storage
+
+
+def generate_book_rows(count, seed=0):
+    # deterministic (name, author, quantity) rows; authors repeat like they do in a real catalog
+    rng = random.Random(seed)
+    authors = [''.join(rng.choices(string.ascii_letters, k=rng.randint(5, 15))) for _ in range(max(1, count // 20))]
+    for _ in range(count):
+        name = ''.join(rng.choices(string.ascii_letters, k=rng.randint(5, 15)))
+        # build a new string object per row like reading it from a file would
+        author = ''.join(rng.choice(authors))
+        yield name, author, rng.randint(1, 100)
+
+
+def measure_book_store(make_record, count):
+    # bytes allocated for a book_dict of count books built with make_record
+    gc.collect()
+    tracemalloc.start()
+    book_dict = {}
+    for book_id, (name, author, quantity) in enumerate(generate_book_rows(count), 1):
+        book_dict[book_id] = make_record(name, author, quantity)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+def memory_benchmark(count):
+    layouts = [
+        ("dict per book", lambda name, author, quantity: {"name": name, "author": author, "quantity": quantity}),
+        ("Book __slots__", Book),
+    ]
+    print(f"Memory used by book_dict with {count} books:")
+    for label, make_record in layouts:
+        used = measure_book_store(make_record, count)
+        print(f"{label:>15}: {used / 1024 / 1024:8.1f} MiB, {used / count:6.1f} bytes per book")
+
+
+def write_dataset(directory, count, seed=0):
+    # count books and count students, and a rental for every tenth student, in the text file format
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "library_data.txt"), 'w') as file:
+        for book_id, (name, author, quantity) in enumerate(generate_book_rows(count, seed), 1):
+            file.write(f"{book_id},{name},{author},{quantity}\n")
+    students = []
+    with open(os.path.join(directory, "students.txt"), 'w') as file:
+        for number in range(count):
+            name = ''.join(rng.choices(string.ascii_letters, k=rng.randint(5, 12)))
+            student_id = str(1000000 + number)
+            students.append((name, student_id))
+            file.write(f"{name},{student_id}\n")
+    with open(os.path.join(directory, "rentals.txt"), 'w') as file:
+        for name, student_id in rng.sample(students, count // 10):
+            file.write(f"{name},{student_id},{rng.randint(1, count)}\n")
+
+
+def peak_memory_mib():
+    # peak resident memory of this process so far
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "seconds": round(total, 6),
+        "ops_per_second": round(len(latencies) / total, 1) if total else None,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 4),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 4),
+        "peak_memory_mib": peak_memory_mib(),
+    }
+
+
+def time_calls(method, calls):
+    # latency of each call; printed messages go to /dev/null so only the work itself is timed
+    latencies = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for args in calls:
+            start = time.perf_counter()
+            method(*args)
+            latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def persisted_calls(count, operations):
+    # every text mode change rewrites whole data files, so large datasets time fewer changes
+    return min(operations, max(5, 200000 // count))
+
+
+def time_changes(results, library, suffix, count, operations, rentals):
+    # new_book, add_rental and return_rental with the writes each call makes, as the menu runs them
+    calls = operations if library.journal_mode or library.storage.row_updates else persisted_calls(count, operations)
+    rentals = rentals[:calls]
+    results["new_book" + suffix] = time_calls(library.new_book, [
+        (f"Benchmark{suffix} Book {number}", "Benchmark Author", 1) for number in range(calls)])
+    results["add_rental" + suffix] = time_calls(library.add_rental, [
+        (name, student_id, book_id) for (name, student_id), book_id in rentals])
+    results["return_rental" + suffix] = time_calls(library.return_rental, [
+        (name, student_id, book_id) for (name, student_id), book_id in rentals])
+
+
+def benchmark_size(directory, count, operations, storage, seed=0):
+    # runs in its own process so peak memory belongs to this dataset size alone
+    rng = random.Random(seed)
+    write_dataset(directory, count, seed)
+    data_path = os.path.join(directory, "library_data.txt")
+    if storage != "text":
+        target = open_storage(storage, data_path)
+        migrate(open_storage("text", data_path), target)
+        if storage == "sqlite":
+            data_path = target.path
+    results = {}
+    start = time.perf_counter()
+    library = Library(data_path, storage=storage)
+    results["load"] = summarize([time.perf_counter() - start])
+
+    book_ids = [rng.randint(1, count) for _ in range(operations)]
+    students = [(name, student_id) for student_id, name in library.iter_students()]
+    picked = [rng.choice(students) for _ in range(operations)]
+    rentals = list(zip(picked, book_ids))
+    results["search_book"] = time_calls(library.search_book, [(book_id,) for book_id in book_ids])
+    results["search_student_by_name"] = time_calls(library.search_student_by_name, [(name,) for name, _ in picked])
+    results["search_rentals"] = time_calls(library.search_rentals, [(student_id,) for _, student_id in picked])
+    time_changes(results, library, "", count, operations, rentals)
+    results["save"] = time_calls(library.save_files, [(["books", "students", "rentals"],)] * 3)
+    results["print_books"] = time_calls(library.print_books, [()])
+    results["display_students"] = time_calls(library.display_students, [()])
+    results["display_rentals"] = time_calls(library.display_rentals, [()])
+    # the same changes appended to the journal, including the compactions it triggers
+    if not library.storage.row_updates:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            library = Library(data_path, storage=storage, journal_mode=True)
+        time_changes(results, library, "_journal", count, operations, rentals)
+    return results
+
+
+def run_suite(sizes, operations, storage, seed=0, work_dir=None):
+    directory = work_dir or tempfile.mkdtemp(prefix="library_benchmark_")
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "storage": storage,
+        "seed": seed,
+        "operations": operations,
+        "sizes": {},
+    }
+    try:
+        for size in sizes:
+            print(f"Benchmarking {size} records with {storage} storage...")
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                results = pool.submit(benchmark_size, os.path.join(directory, str(size)), size, operations,
+                                      storage, seed).result()
+            report["sizes"][str(size)] = results
+            print_results(results)
+    finally:
+        if work_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+def print_results(results):
+    print(f"{'operation':>24} {'calls':>7} {'ops/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'peak MiB':>9}")
+    for operation, result in results.items():
+        print(f"{operation:>24} {result['calls']:>7} {result['ops_per_second'] or 0:>12.1f} "
+              f"{result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} {result['peak_memory_mib'] or 0:>9.1f}")
+
+
+def compare_reports(baseline, report, tolerance=0.2):
+    # operations whose p50 latency got slower than the baseline by more than tolerance
+    regressions = []
+    for size, results in report["sizes"].items():
+        for operation, result in results.items():
+            old = baseline.get("sizes", {}).get(size, {}).get(operation)
+            if old and old["p50_ms"] and result["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+                regressions.append((size, operation, old["p50_ms"], result["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Library Management System benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="number of books and of students in each generated dataset")
+    parser.add_argument("--operations", type=int, default=1000, help="calls timed per operation")
+    parser.add_argument("--storage", choices=STORAGES, default="text")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are saved to")
+    parser.add_argument("--compare", help="earlier results JSON to check for slower operations")
+    parser.add_argument("--work-dir", help="keep the generated datasets in this directory")
+    parser.add_argument("--books", type=int, help="only compare the memory used by book records for this many books")
+    args = parser.parse_args()
+
+    if args.books:
+        memory_benchmark(args.books)
+        return
+    report = run_suite(args.sizes, args.operations, args.storage, args.seed, args.work_dir)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to '{args.output}'.")
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare_reports(json.load(file), report)
+        for size, operation, old, new in regressions:
+            print(f"Slower: {operation} at {size} records, p50 {old:.3f} ms -> {new:.3f} ms")
+        if not regressions:
+            print(f"No operation is slower than in '{args.compare}'.")
+
+
+if __name__ == "__main__":
+    main()
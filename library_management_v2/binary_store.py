@@ -0,0 +1,231 @@
+import argparse
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import MutableMapping
+from operator import itemgetter
+
+from records import Book
+from safe_files import atomic_write
+
+# file layout: header, one uint64 offset per record, then the records sorted by key
+MAGIC = b"LIBM"
+HEADER = struct.Struct("<4sBQ")  # magic, kind, record count
+BOOK = struct.Struct("<qqHH")  # book id, quantity, name length, author length
+STUDENT = struct.Struct("<HH")  # student id length, name length
+BOOKS = 1
+STUDENTS = 2
+
+
+def encode_book(book_id, book):
+    name = book['name'].encode()
+    author = book['author'].encode()
+    return BOOK.pack(book_id, int(book['quantity']), len(name), len(author)) + name + author
+
+
+def decode_book(buffer, offset):
+    book_id, quantity, name_length, author_length = BOOK.unpack_from(buffer, offset)
+    start = offset + BOOK.size
+    name = buffer[start:start + name_length].decode()
+    author = buffer[start + name_length:start + name_length + author_length].decode()
+    return book_id, Book(name, author, quantity)
+
+
+def decode_book_id(buffer, offset):
+    return BOOK.unpack_from(buffer, offset)[0]
+
+
+def encode_student(student_id, name):
+    student_id = student_id.encode()
+    name = name.encode()
+    return STUDENT.pack(len(student_id), len(name)) + student_id + name
+
+
+def decode_student(buffer, offset):
+    id_length, name_length = STUDENT.unpack_from(buffer, offset)
+    start = offset + STUDENT.size
+    return buffer[start:start + id_length].decode(), buffer[start + id_length:start + id_length + name_length].decode()
+
+
+def decode_student_id(buffer, offset):
+    id_length = STUDENT.unpack_from(buffer, offset)[0]
+    start = offset + STUDENT.size
+    return buffer[start:start + id_length].decode()
+
+
+CODECS = {
+    BOOKS: (encode_book, decode_book, decode_book_id),
+    STUDENTS: (encode_student, decode_student, decode_student_id),
+}
+
+
+class MappedRecords(MutableMapping):
+    # dict-like view of a binary record file opened with mmap; records are decoded only when
+    # they are accessed, and changes are kept in memory on top of the mapped file
+    def __init__(self, path, kind):
+        self.kind = kind
+        self.encode, self.decode, self.decode_key = CODECS[kind]
+        # decoded books are cached so changes made through the returned dict are kept
+        self.cache_reads = kind == BOOKS
+        self.overlay = {}
+        self.added = set()
+        self.deleted = set()
+        self.buffer = b""
+        self.offsets = []
+        self.count = 0
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as file:
+                self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, file_kind, self.count = HEADER.unpack_from(self.buffer, 0)
+            if magic != MAGIC or file_kind != kind:
+                raise ValueError(f"'{path}' is not a binary file of the expected kind.")
+            self.offsets = memoryview(self.buffer)[HEADER.size:HEADER.size + 8 * self.count].cast('Q')
+        self.length = self.count
+
+    def find(self, key):
+        # binary search the mapped records, decoding only the keys on the search path
+        low = 0
+        high = self.count - 1
+        while low <= high:
+            mid = (low + high) // 2
+            mid_key = self.decode_key(self.buffer, self.offsets[mid])
+            if mid_key == key:
+                return mid
+            elif mid_key < key:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return -1
+
+    def __getitem__(self, key):
+        if key in self.overlay:
+            return self.overlay[key]
+        position = -1 if key in self.deleted else self.find(key)
+        if position == -1:
+            raise KeyError(key)
+        value = self.decode(self.buffer, self.offsets[position])[1]
+        if self.cache_reads:
+            self.overlay[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.length += 1
+            if key in self.deleted:
+                self.deleted.discard(key)
+            else:
+                self.added.add(key)
+        self.overlay[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.overlay.pop(key, None)
+        if key in self.added:
+            self.added.discard(key)
+        else:
+            self.deleted.add(key)
+        self.length -= 1
+
+    def __contains__(self, key):
+        if key in self.overlay:
+            return True
+        return key not in self.deleted and self.find(key) != -1
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        # mapped keys in sorted order, then keys added since the file was opened
+        for position in range(self.count):
+            key = self.decode_key(self.buffer, self.offsets[position])
+            if key not in self.deleted:
+                yield key
+        yield from list(self.added)
+
+    def items(self):
+        # walk the records without caching them, so a full scan does not load the whole file
+        for position in range(self.count):
+            key, value = self.decode(self.buffer, self.offsets[position])
+            if key not in self.deleted:
+                yield key, self.overlay.get(key, value)
+        for key in list(self.added):
+            yield key, self.overlay[key]
+
+    def values(self):
+        for key, value in self.items():
+            yield value
+
+    def last_key(self, default=None):
+        # records are sorted, so the largest key is the last record or one added since
+        keys = list(self.added)
+        for position in range(self.count - 1, -1, -1):
+            key = self.decode_key(self.buffer, self.offsets[position])
+            if key not in self.deleted:
+                keys.append(key)
+                break
+        return max(keys, default=default)
+
+
+def write_records(path, kind, items):
+    # items are (key, value) pairs; the file is replaced only once it is completely written
+    encode = CODECS[kind][0]
+    records = [encode(key, value) for key, value in sorted(dict(items).items(), key=itemgetter(0))]
+    offsets = array('Q')
+    position = HEADER.size + 8 * len(records)
+    for record in records:
+        offsets.append(position)
+        position += len(record)
+    with atomic_write(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, kind, len(records)))
+        file.write(offsets.tobytes())
+        file.writelines(records)
+
+
+def read_text_records(path, kind):
+    # parse the books or students text file into (key, value) pairs
+    with open(path, 'r') as file:
+        for line in file:
+            data = line.strip().split(',')
+            if kind == BOOKS and len(data) == 4:
+                book_id, name, author, quantity = data
+                yield int(book_id), Book(name, author, quantity)
+            elif kind == STUDENTS and len(data) == 2:
+                name, student_id = data
+                yield student_id, name
+            elif line.strip():
+                print(f"Ignoring line in '{path}': {line.strip()}. It does not contain valid data.")
+
+
+def text_to_binary(text_path, binary_path, kind):
+    write_records(binary_path, kind, read_text_records(text_path, kind))
+
+
+def binary_to_text(binary_path, text_path, kind):
+    records = MappedRecords(binary_path, kind)
+    with open(text_path, 'w') as file:
+        for key, value in records.items():
+            if kind == BOOKS:
+                file.write(f"{key},{value['name']},{value['author']},{value['quantity']}\n")
+            else:
+                file.write(f"{value},{key}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the library data files between text and binary formats")
+    parser.add_argument("direction", choices=["to-binary", "to-text"])
+    args = parser.parse_args()
+
+    files = [("library_data.txt", "library_data.bin", BOOKS), ("students.txt", "students.bin", STUDENTS)]
+    for text_path, binary_path, kind in files:
+        if args.direction == "to-binary":
+            text_to_binary(text_path, binary_path, kind)
+            print(f"Converted '{text_path}' to '{binary_path}'.")
+        else:
+            binary_to_text(binary_path, text_path, kind)
+            print(f"Converted '{binary_path}' to '{text_path}'.")
+
+
+if __name__ == "__main__":
+    main()
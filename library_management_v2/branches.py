@@ -0,0 +1,607 @@
+import argparse
+import contextlib
+import heapq
+import io
+import os
+import sys
+import traceback
+import zlib
+from datetime import date, timedelta
+from multiprocessing import Pipe, Process
+
+from library import Library
+from storage import open_storage
+
+
+# calls a worker can run on one of its shards; each gets the shard's Library first and returns
+# plain tuples, so results are cheap to send back between processes
+def last_book_id(library):
+    return library.last_book_id
+
+
+def book_info(library, book_id):
+    book = library.binary_search_books(book_id)
+    return None if book == -1 else (book['name'], book['author'], book['quantity'])
+
+
+def student_name(library, student_id):
+    return library.student_dict.get(str(student_id))
+
+
+def new_book(library, name, author, quantity, book_id):
+    # the coordinator hands out the ids, so a new book gets the same id whichever shard it goes to
+    library.last_book_id = max(library.last_book_id, book_id - 1)
+    library.new_book(name, author, quantity)
+    return library.find_title(name.strip())
+
+
+def text_search(library, field, query, limit):
+    return [(book_id, score) + book_info(library, book_id)
+            for book_id, score in library.search_books_by_text(field, query, limit)]
+
+
+def rented_books(library, student_id):
+    return [(book_id,) + (book_info(library, book_id) or ("Unknown", "Unknown", 0))
+            for book_id in sorted(library.rented_books(student_id))]
+
+
+def due_rentals(library, start, end):
+    return [rental + (library.book_dict.get(rental[3], {}).get('name', "Unknown"),)
+            for rental in library.rentals_due_between(start, end)]
+
+
+def report_parts(library, limit):
+    # the whole author and student totals are sent, because an author or student can be near the
+    # top overall without being near the top of any one shard
+    aggregates = library.aggregates
+    out_of_stock = library.out_of_stock_books()
+    return {
+        "out_of_stock": len(out_of_stock),
+        "out_of_stock_books": [(book_id,) + book_info(library, book_id)[:2] for book_id in out_of_stock[:limit]],
+        "author_copies": aggregates.author_copies.counts,
+        "author_titles": aggregates.author_titles,
+        "student_loans": aggregates.student_loans.counts,
+        "top_books": [(book_id, count, library.book_dict.get(book_id, {}).get('name', "Unknown"))
+                      for book_id, count in library.top_books(limit)],
+    }
+
+
+def author_copies(library, author):
+    aggregates = library.aggregates
+    return aggregates.author_titles.get(author, 0), aggregates.author_copies.get(author)
+
+
+SHARD_CALLS = {
+    "last_book_id": last_book_id,
+    "book_info": book_info,
+    "student_name": student_name,
+    "new_book": new_book,
+    "find_title": Library.find_title,
+    "remove_book": Library.remove_book,
+    "text_search": text_search,
+    "add_student": Library.add_student,
+    "delete_student": Library.delete_student,
+    "find_students": Library.find_students,
+    "add_rental": Library.add_rental,
+    "return_rental": Library.return_rental,
+    "renew_rental": Library.renew_rental,
+    "rented_books": rented_books,
+    "book_holders_of": Library.book_holders_of,
+    "due_rentals": due_rentals,
+    "report_parts": report_parts,
+    "author_copies": author_copies,
+}
+
+
+def shard_worker(connection, shard_paths, options):
+    # runs in its own process with the Library of every shard given to it, and answers
+    # (call name, [(shard, args)]) messages until it receives None
+    libraries = {shard: Library(path, **options) for shard, path in shard_paths.items()}
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        name, calls = message
+        try:
+            replies = []
+            for shard, args in calls:
+                # the messages a Library prints are sent back with the result
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    result = SHARD_CALLS[name](libraries[shard], *args)
+                replies.append((result, output.getvalue()))
+            connection.send(("ok", replies))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+    connection.close()
+
+
+class BranchCoordinator:
+    # one Library per branch or shard, each loaded and queried in a worker process. the shards are
+    # spread over at most one worker per core, so a query that fans out to every shard runs on all
+    # cores at once however many shards there are.
+    # shard_by="branch" opens existing branch directories that each keep their own books and students;
+    # shard_by="hash" opens the directories written by split_library, where a book belongs to shard
+    # book_id % shards and a student to a hash of the student id
+    def __init__(self, shard_dirs, shard_by="branch", workers=None, storage="text", journal_mode=False,
+                 loan_days=14):
+        if shard_by not in ("branch", "hash"):
+            raise ValueError(f"Unknown shard_by '{shard_by}', expected 'branch' or 'hash'.")
+        if not shard_dirs:
+            raise ValueError("At least one branch directory is needed.")
+        self.shard_by = shard_by
+        self.shard_dirs = list(shard_dirs)
+        self.names = [os.path.basename(os.path.normpath(shard_dir)) for shard_dir in self.shard_dirs]
+        data_name = "library.db" if storage == "sqlite" else "library_data.txt"
+        # each worker loads its shards itself, so the workers do not start process pools of their own
+        options = {"storage": storage, "journal_mode": journal_mode, "loan_days": loan_days, "load_workers": 1}
+        workers = min(workers or os.cpu_count() or 1, len(self.shard_dirs))
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            shard_paths = {shard: os.path.join(shard_dir, data_name) for shard, shard_dir in enumerate(self.shard_dirs)
+                           if shard % workers == worker}
+            connection, child_connection = Pipe()
+            process = Process(target=shard_worker, args=(child_connection, shard_paths, options))
+            process.start()
+            child_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self.last_book_id = max(self.call_all("last_book_id"))
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def call(self, name, calls):
+        # run (shard, args) calls, each worker going through its own calls while the others do the same;
+        # returns the results in the order of calls and prints what the shards printed
+        batches = [[] for _ in self.connections]
+        for position, (shard, args) in enumerate(calls):
+            batches[shard % len(batches)].append((position, shard, args))
+        for connection, batch in zip(self.connections, batches):
+            if batch:
+                connection.send((name, [(shard, args) for position, shard, args in batch]))
+        results = [None] * len(calls)
+        outputs = [""] * len(calls)
+        errors = []
+        for connection, batch in zip(self.connections, batches):
+            if not batch:
+                continue
+            status, replies = connection.recv()
+            if status == "error":
+                errors.append(replies)
+                continue
+            for (position, shard, args), (result, output) in zip(batch, replies):
+                results[position] = result
+                outputs[position] = output
+        sys.stdout.write("".join(outputs))
+        if errors:
+            raise RuntimeError(f"'{name}' failed in a shard:\n{errors[0]}")
+        return results
+
+    def call_all(self, name, *args):
+        return self.call(name, [(shard, args) for shard in range(len(self.names))])
+
+    def call_one(self, shard, name, *args):
+        return self.call(name, [(shard, args)])[0]
+
+    def shard_number(self, branch):
+        # a branch is given by its position or its directory name
+        if branch in self.names:
+            return self.names.index(branch)
+        if str(branch).isdigit() and int(branch) < len(self.names):
+            return int(branch)
+        raise ValueError(f"Unknown branch '{branch}', expected one of {', '.join(self.names)}.")
+
+    def student_shard(self, student_id):
+        # crc32 rather than hash(), which changes between runs for strings
+        return zlib.crc32(str(student_id).encode()) % len(self.names)
+
+    def book_shards(self, book_id):
+        # shards holding the book id; in branch mode each branch numbered its own books, so there may be several
+        if self.shard_by == "hash":
+            return [int(book_id) % len(self.names)]
+        return [shard for shard, book in enumerate(self.call_all("book_info", int(book_id))) if book is not None]
+
+    def owner_shard(self, book_id, branch=None):
+        # the shard a change to the book goes to, or None after saying why there is none
+        if branch is not None:
+            return self.shard_number(branch)
+        shards = self.book_shards(book_id)
+        if len(shards) == 1:
+            return shards[0]
+        if not shards:
+            print(f"Book with ID '{book_id}' not found in any branch.")
+        else:
+            print(f"Book with ID '{book_id}' is in branches {', '.join(self.names[shard] for shard in shards)}, "
+                  f"please give the branch.")
+        return None
+
+    def student_names(self, student_ids):
+        # {student_id: name} for the students found, asking every shard that may hold them in one round trip
+        student_ids = [str(student_id) for student_id in student_ids]
+        if self.shard_by == "hash":
+            calls = [(self.student_shard(student_id), (student_id,)) for student_id in student_ids]
+        else:
+            calls = [(shard, (student_id,)) for student_id in student_ids for shard in range(len(self.names))]
+        names = {}
+        for (shard, (student_id,)), name in zip(calls, self.call("student_name", calls)):
+            if name is not None:
+                names.setdefault(student_id, name)
+        return names
+
+    def new_book(self, name, author, quantity, branch=None):
+        book_id = self.last_book_id + 1
+        if self.shard_by == "hash":
+            # a title already in the catalog gets more copies in its shard, a new title goes to the
+            # shard of its new id
+            existing = [shard for shard, found in enumerate(self.call_all("find_title", name.strip())) if found]
+            shard = existing[0] if existing else book_id % len(self.names)
+        elif branch is None:
+            print("Please give the branch the book is added to.")
+            return None
+        else:
+            shard = self.shard_number(branch)
+        self.last_book_id = book_id
+        return self.call_one(shard, "new_book", name, author, quantity, book_id)
+
+    def remove_book(self, book_id, quantity, branch=None):
+        shard = self.owner_shard(book_id, branch)
+        return shard is not None and self.call_one(shard, "remove_book", int(book_id), quantity)
+
+    def find_book(self, book_id):
+        # (shard, name, author, quantity) for every shard with the book
+        shards = self.book_shards(book_id)
+        books = self.call("book_info", [(shard, (int(book_id),)) for shard in shards])
+        return [(shard,) + book for shard, book in zip(shards, books) if book is not None]
+
+    def search_book(self, book_id):
+        books = self.find_book(book_id)
+        if not books:
+            print("Book not found in the library.")
+        for shard, name, author, quantity in books:
+            print(f"Branch: {self.names[shard]}, Book '{name}' by {author}, Quantity: {quantity}")
+
+    def search_books_by_text(self, field, query, limit=10):
+        # every shard ranks its own books and the best limit of all of them are kept, ranked like SearchIndex
+        matches = []
+        for shard, shard_matches in enumerate(self.call_all("text_search", field, query, limit)):
+            matches.extend((shard,) + match for match in shard_matches)
+        return heapq.nsmallest(limit, matches, key=lambda x: (-x[2], x[1], x[0]))
+
+    def search_book_by_title(self, query, limit=10):
+        self.print_text_matches(query, self.search_books_by_text("name", query, limit))
+
+    def search_book_by_author(self, query, limit=10):
+        self.print_text_matches(query, self.search_books_by_text("author", query, limit))
+
+    def print_text_matches(self, query, matches):
+        if matches:
+            print(f"Books matching '{query.strip()}':")
+            for shard, book_id, score, name, author, quantity in matches:
+                print(f"Branch: {self.names[shard]}, Book ID: {book_id}, Name: '{name}' by {author}, "
+                      f"Quantity: {quantity}")
+        else:
+            print("No matching books found in the library.")
+
+    def add_student(self, name, student_id, branch=None):
+        if self.shard_by == "hash":
+            shard = self.student_shard(student_id)
+        elif branch is None:
+            print("Please give the branch the student is added to.")
+            return False
+        else:
+            shard = self.shard_number(branch)
+        existing = self.student_names([student_id]).get(str(student_id))
+        if existing is not None:
+            print(f"Student with ID '{student_id}' already exists in the list with name '{existing}'.")
+            return False
+        return self.call_one(shard, "add_student", name, student_id)
+
+    def delete_student(self, name, student_id):
+        if self.shard_by == "hash":
+            shards = [self.student_shard(student_id)]
+        else:
+            shards = [shard for shard, found in enumerate(self.call_all("student_name", student_id)) if found is not None]
+        if not shards:
+            print(f"Student with name '{name.strip()}' and ID '{student_id}' not found in the database.")
+            return False
+        return any(self.call("delete_student", [(shard, (name, student_id)) for shard in shards]))
+
+    def find_students(self, name):
+        # (student_id, name, shard) of every student with the name, in id order
+        students = []
+        for shard, shard_students in enumerate(self.call_all("find_students", name.strip())):
+            students.extend((student_id, student, shard) for student_id, student in shard_students)
+        return sorted(students)
+
+    def search_student_by_name(self, name):
+        students = self.find_students(name)
+        if students:
+            print(f"Students with the name '{name.strip()}':")
+            for student_id, student, shard in students:
+                print(f"Student Name: {student}, Student ID: {student_id}, Branch: {self.names[shard]}")
+        else:
+            print("Student not found.")
+
+    def add_rental(self, student_name, student_id, book_id, branch=None):
+        # the student may be kept by another shard than the book, so the coordinator checks for the
+        # student and the shard that owns the book only does the rental
+        student_id = str(student_id)
+        known_name = self.student_names([student_id]).get(student_id)
+        if known_name is None:
+            print("Student not found in the database.")
+            return False
+        shard = self.owner_shard(book_id, branch)
+        if shard is None:
+            return False
+        return self.call_one(shard, "add_rental", student_name.strip() or known_name, student_id, int(book_id),
+                             False)
+
+    def return_rental(self, student_name, student_id, book_id, branch=None):
+        return self.change_rental("return_rental", student_name, student_id, book_id, branch)
+
+    def renew_rental(self, student_name, student_id, book_id, branch=None):
+        return self.change_rental("renew_rental", student_name, student_id, book_id, branch)
+
+    def change_rental(self, name, student_name, student_id, book_id, branch):
+        student_id = str(student_id)
+        student_name = student_name.strip() or self.student_names([student_id]).get(student_id, "")
+        shard = self.owner_shard(book_id, branch)
+        if shard is None:
+            return False
+        return self.call_one(shard, name, student_name, student_id, int(book_id))
+
+    def rented_books(self, student_id):
+        # (shard, book_id, name, author, quantity) of the books the student holds in any shard
+        books = []
+        for shard, shard_books in enumerate(self.call_all("rented_books", str(student_id))):
+            books.extend((shard,) + book for book in shard_books)
+        return books
+
+    def search_rentals(self, student_id):
+        books = self.rented_books(student_id)
+        if books:
+            print(f"Rentals for the student with ID '{student_id}':")
+            for shard, book_id, name, author, quantity in books:
+                print(f"Branch: {self.names[shard]}, Book ID: {book_id}, Book Title: {name}, Author: {author}, "
+                      f"Quantity: {quantity}")
+        else:
+            print(f"No rentals found for the student with ID '{student_id}'.")
+
+    def book_holders_of(self, book_id):
+        # (student_name, student_id, shard) of everyone holding a copy of the book in any shard that has it
+        shards = self.book_shards(book_id)
+        holders = []
+        for shard, shard_holders in zip(shards, self.call("book_holders_of", [(shard, (int(book_id),))
+                                                                               for shard in shards])):
+            holders.extend((student_name, student_id, shard) for student_name, student_id in shard_holders)
+        return sorted(holders, key=lambda x: (x[1], x[0], x[2]))
+
+    def search_book_holders(self, book_id):
+        holders = self.book_holders_of(book_id)
+        if holders:
+            print(f"Students holding the book with ID '{book_id}':")
+            for student_name, student_id, shard in holders:
+                print(f"Student Name: {student_name}, Student ID: {student_id}, Branch: {self.names[shard]}")
+        else:
+            print(f"No students currently hold the book with ID '{book_id}'.")
+
+    def rentals_due_between(self, start, end):
+        # (due, student_id, student_name, book_id, book title, shard); every shard returns its rentals in
+        # due date order, so they are merged rather than sorted again
+        parts = self.call_all("due_rentals", start, end)
+        return list(heapq.merge(*[[rental + (shard,) for rental in part] for shard, part in enumerate(parts)]))
+
+    def overdue_rentals(self, today=None):
+        return self.rentals_due_between(date.min, today or date.today())
+
+    def rentals_due_this_week(self, today=None):
+        today = today or date.today()
+        return self.rentals_due_between(today, today + timedelta(days=7))
+
+    def print_due_rentals(self, title, rentals):
+        if not rentals:
+            print(f"{title}: none.")
+            return
+        print(f"{title}:")
+        for due, student_id, student_name, book_id, book_title, shard in rentals:
+            print(f"Student Name: {student_name}, Student ID: {student_id}, Book ID: {book_id}, "
+                  f"Book Title: {book_title}, Due: {due}, Branch: {self.names[shard]}")
+
+    def inventory_report(self, limit=10):
+        # the figures of Library.print_inventory_report over every shard
+        parts = self.call_all("report_parts", limit)
+        author_copies = {}
+        author_titles = {}
+        student_loans = {}
+        for part in parts:
+            for author, titles in part["author_titles"].items():
+                author_titles[author] = author_titles.get(author, 0) + titles
+            for author, copies in part["author_copies"].items():
+                author_copies[author] = author_copies.get(author, 0) + copies
+            # a student's loans are spread over the shards of the books they rented
+            for student_id, count in part["student_loans"].items():
+                student_loans[student_id] = student_loans.get(student_id, 0) + count
+        # most copies first and authors in order within a count, like RankedCounter.top
+        top_authors = heapq.nsmallest(limit, author_copies.items(), key=lambda x: (-x[1], x[0]))
+        return {
+            "out_of_stock": sum(part["out_of_stock"] for part in parts),
+            "out_of_stock_books": heapq.nsmallest(limit, [book + (shard,) for shard, part in enumerate(parts)
+                                                          for book in part["out_of_stock_books"]]),
+            "authors": [(author, author_titles[author], copies) for author, copies in top_authors],
+            "students": heapq.nsmallest(limit, student_loans.items(), key=lambda x: (-x[1], x[0])),
+            "books": heapq.nsmallest(limit, [book + (shard,) for shard, part in enumerate(parts)
+                                             for book in part["top_books"]], key=lambda x: (-x[1], x[0], x[3])),
+        }
+
+    def print_inventory_report(self, limit=10):
+        report = self.inventory_report(limit)
+        print(f"Books out of stock: {report['out_of_stock']}")
+        for book_id, name, author, shard in report["out_of_stock_books"]:
+            print(f"Branch: {self.names[shard]}, Book ID: {book_id}, Name: '{name}' by {author}")
+        if report["out_of_stock"] > limit:
+            print(f"... and {report['out_of_stock'] - limit} more.")
+        print("Authors with the most copies:")
+        for author, titles, copies in report["authors"]:
+            print(f"Author: {author}, Titles: {titles}, Copies: {copies}")
+        print("Students with the most rentals:")
+        names = self.student_names(student_id for student_id, count in report["students"])
+        for student_id, count in report["students"]:
+            print(f"Student Name: {names.get(student_id, 'Unknown')}, Student ID: {student_id}, "
+                  f"Books rented: {count}")
+        print("Most rented books:")
+        for book_id, count, book_title, shard in report["books"]:
+            print(f"Branch: {self.names[shard]}, Book ID: {book_id}, Book Title: {book_title}, Copies rented: {count}")
+
+    def print_author_copies(self, author):
+        author = author.strip()
+        totals = self.call_all("author_copies", author)
+        titles = sum(shard_titles for shard_titles, copies in totals)
+        if titles:
+            print(f"Author {author} has {titles} titles with {sum(copies for titles, copies in totals)} "
+                  f"copies in the library.")
+        else:
+            print(f"No books by {author} in the library.")
+
+
+def split_library(data_path, target_dir, shards):
+    # write the text files of shard directories shard-0, shard-1, ... from one library: a book goes to
+    # shard book_id % shards, a student to the crc32 of the student id and a rental to the shard of its book
+    source = Library(data_path)
+    width = len(str(shards - 1))
+    shard_dirs = []
+    for shard in range(shards):
+        shard_dir = os.path.join(target_dir, f"shard-{shard:0{width}d}")
+        os.makedirs(shard_dir, exist_ok=True)
+        storage = open_storage("text", os.path.join(shard_dir, "library_data.txt"))
+        storage.save_books({book_id: book for book_id, book in source.book_dict.items() if book_id % shards == shard})
+        storage.save_students({student_id: name for student_id, name in source.student_dict.items()
+                               if zlib.crc32(student_id.encode()) % shards == shard})
+        rentals = {}
+        for (student_name, student_id), book_ids in source.rentals_dict.items():
+            shard_book_ids = {book_id for book_id in book_ids if book_id % shards == shard}
+            if shard_book_ids:
+                rentals[(student_name, student_id)] = shard_book_ids
+        storage.save_rentals(rentals, source.rental_dates)
+        shard_dirs.append(shard_dir)
+    print(f"Split {len(source.book_dict)} books, {len(source.student_dict)} students and "
+          f"{sum(len(book_ids) for book_ids in source.rentals_dict.values())} rentals into {shards} shards "
+          f"in '{target_dir}'.")
+    return shard_dirs
+
+
+def read_branch(coordinator):
+    # the branch for a new book or student; hash shards choose it themselves
+    if coordinator.shard_by == "hash":
+        return None
+    return input(f"Enter branch ({', '.join(coordinator.names)}): ").strip()
+
+
+def run_menu(coordinator):
+    while True:
+        print("\nLibrary Branches")
+        print("1. Add Book")
+        print("2. Search Book")
+        print("3. Search Book by Title")
+        print("4. Search Book by Author")
+        print("5. Add Student")
+        print("6. Search Student")
+        print("7. Rent Book")
+        print("8. Return Book")
+        print("9. Renew Rental")
+        print("10. Search Rentals")
+        print("11. Search Book Holders")
+        print("12. Inventory Report")
+        print("13. Copies by Author")
+        print("14. Overdue Rentals")
+        print("15. Rentals Due This Week")
+        print("0. Quit")
+
+        choice = input("Enter your choice: ")
+        try:
+            if choice == "1":
+                name = input("Enter book name: ")
+                author = input("Enter book author: ")
+                quantity = int(input("Enter book quantity: "))
+                coordinator.new_book(name, author, quantity, read_branch(coordinator))
+            elif choice == "2":
+                coordinator.search_book(int(input("Enter book ID to search: ")))
+            elif choice == "3":
+                coordinator.search_book_by_title(input("Enter title or part of a title to search: "))
+            elif choice == "4":
+                coordinator.search_book_by_author(input("Enter author or part of an author name to search: "))
+            elif choice == "5":
+                name = input("Enter student name: ")
+                student_id = int(input("Enter student ID: "))
+                coordinator.add_student(name, student_id, read_branch(coordinator))
+            elif choice == "6":
+                coordinator.search_student_by_name(input("Enter student name to search: "))
+            elif choice in ("7", "8", "9"):
+                name = input("Enter student name (leave blank for a known student): ")
+                student_id = int(input("Enter student ID: "))
+                book_id = int(input("Enter book ID: "))
+                branch = None
+                if coordinator.shard_by == "branch":
+                    branch = input("Enter branch (leave blank to find it by book ID): ").strip() or None
+                method = {"7": coordinator.add_rental, "8": coordinator.return_rental,
+                          "9": coordinator.renew_rental}[choice]
+                method(name, student_id, book_id, branch)
+            elif choice == "10":
+                coordinator.search_rentals(int(input("Enter student ID to search rentals: ")))
+            elif choice == "11":
+                coordinator.search_book_holders(int(input("Enter book ID to search holders: ")))
+            elif choice == "12":
+                coordinator.print_inventory_report()
+            elif choice == "13":
+                coordinator.print_author_copies(input("Enter author name: "))
+            elif choice == "14":
+                coordinator.print_due_rentals("Overdue rentals", coordinator.overdue_rentals())
+            elif choice == "15":
+                coordinator.print_due_rentals("Rentals due this week", coordinator.rentals_due_this_week())
+            elif choice == "0":
+                print("Exiting...")
+                break
+            else:
+                print("Invalid choice. Please enter a valid option.")
+        except ValueError as error:
+            print(f"Invalid input: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and update several library branches or shards at once")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split_parser = subparsers.add_parser("split", help="split one library into hash shards")
+    split_parser.add_argument("data", help="books file of the library to split")
+    split_parser.add_argument("target", help="directory for the shard directories")
+    split_parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    open_parser = subparsers.add_parser("open", help="open branch or shard directories and show the menu")
+    open_parser.add_argument("directories", nargs="+",
+                             help="branch directories, or every shard directory in order for --shard-by hash")
+    open_parser.add_argument("--shard-by", choices=["branch", "hash"], default="branch")
+    open_parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    open_parser.add_argument("--storage", choices=["text", "binary", "sqlite"], default="text")
+    open_parser.add_argument("--journal", action="store_true", help="append changes to each branch's journal")
+    open_parser.add_argument("--loan-days", type=int, default=14)
+    args = parser.parse_args()
+
+    if args.command == "split":
+        split_library(args.data, args.target, args.shards)
+        return
+    with BranchCoordinator(args.directories, args.shard_by, args.workers, args.storage, args.journal,
+                           args.loan_days) as coordinator:
+        run_menu(coordinator)
+
+
+if __name__ == "__main__":
+    main()
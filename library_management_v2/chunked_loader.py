@@ -0,0 +1,145 @@
+import gc
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+# files smaller than this are parsed in this process, starting workers would cost more than it saves
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+
+@contextmanager
+def paused_gc():
+    # loading creates millions of objects that all stay alive, so the cyclic garbage collector would
+    # run over and over without finding anything to free
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def parse_book(fields):
+    book_id, name, author, quantity = fields
+    return int(book_id), name, author, int(quantity)
+
+
+def parse_student(fields):
+    name, student_id = fields
+    return student_id, name
+
+
+def parse_rental(fields):
+    # older rentals have no rented and due dates
+    if len(fields) == 3:
+        fields = fields + ["", ""]
+    student_name, student_id, book_id, rented, due = fields
+    for day in (rented, due):
+        if day:
+            date.fromisoformat(day)
+    if rented and not due:
+        raise ValueError
+    return student_name, student_id, int(book_id), rented, due
+
+
+# kind -> (numbers of fields, parser, positions of the integer fields, what a valid line looks like)
+PARSERS = {
+    "books": ((4,), parse_book, (0, 3), "expected book_id,name,author,quantity with numeric id and quantity"),
+    "students": ((2,), parse_student, (), "expected name,student_id"),
+    "rentals": ((3, 5), parse_rental, (2,),
+                "expected student_name,student_id,book_id[,rented_on,due_on] with a numeric book id "
+                "and YYYY-MM-DD dates"),
+}
+
+
+def parse_chunk(path, kind, start, end):
+    # parse the lines between two byte offsets; returns the rows, the bad lines as
+    # (line index in the chunk, line, reason) and the number of lines in the chunk
+    field_counts, parse, _, expected = PARSERS[kind]
+    with open(path, 'rb') as file:
+        file.seek(start)
+        lines = file.read(end - start).decode().split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    rows = []
+    bad_lines = []
+    with paused_gc():
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            fields = line.split(',')
+            try:
+                if len(fields) not in field_counts:
+                    raise ValueError
+                rows.append(parse(fields))
+            except ValueError:
+                bad_lines.append((index, line, expected))
+    return rows, bad_lines, len(lines)
+
+
+def parse_chunk_columns(path, kind, start, end):
+    # parse_chunk for a worker process. the rows go back as one array or string per column,
+    # which is much cheaper to send between processes than a tuple per row
+    rows, bad_lines, line_count = parse_chunk(path, kind, start, end)
+    numeric = PARSERS[kind][2]
+    columns = [array('q', column).tobytes() if number in numeric else "\n".join(column)
+               for number, column in enumerate(zip(*rows))]
+    return columns, bad_lines, line_count
+
+
+def column_rows(kind, columns):
+    numeric = PARSERS[kind][2]
+    decoded = []
+    for number, column in enumerate(columns):
+        if number in numeric:
+            values = array('q')
+            values.frombytes(column)
+            decoded.append(values)
+        else:
+            # lines never contain a newline, so it can separate the values
+            decoded.append(column.split("\n"))
+    return zip(*decoded)
+
+
+def chunk_ranges(path, chunks):
+    # about equal byte ranges that each start at the beginning of a line
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as file:
+        for number in range(1, chunks):
+            file.seek(size * number // chunks)
+            file.readline()
+            if starts[-1] < file.tell() < size:
+                starts.append(file.tell())
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def load_records(path, kind, workers=None):
+    # parse a books, students or rentals text file, in parallel chunks when it is large.
+    # returns the rows as a list with the rows of each chunk, in file order, and the bad lines as
+    # (line number, line, reason).
+    # only the parsing is split over the workers: the Book records and the dicts have to be built in this
+    # process, and for books that takes about as long as the parsing, so more cores make a load at most
+    # about twice as fast. sending built records back would cost more than building them here
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    if workers == 1 or size < PARALLEL_MIN_BYTES:
+        parts = [parse_chunk(path, kind, 0, size)]
+    else:
+        ranges = chunk_ranges(path, workers)
+        with ProcessPoolExecutor(workers) as pool:
+            parts = [(column_rows(kind, columns), bad_lines, line_count) for columns, bad_lines, line_count in
+                     pool.map(parse_chunk_columns, [path] * len(ranges), [kind] * len(ranges),
+                              [start for start, end in ranges], [end for start, end in ranges])]
+    rows = []
+    bad_lines = []
+    first_line = 1
+    for part_rows, part_bad_lines, line_count in parts:
+        rows.append(part_rows)
+        bad_lines.extend((first_line + index, line, reason) for index, line, reason in part_bad_lines)
+        first_line += line_count
+    return rows, bad_lines
@@ -0,0 +1,194 @@
+import contextlib
+import json
+import os
+import shlex
+import sys
+import time
+
+USAGE = {
+    "add_book": "add_book NAME AUTHOR QUANTITY",
+    "remove_book": "remove_book BOOK_ID QUANTITY",
+    "search_book": "search_book BOOK_ID",
+    "search_title": "search_title QUERY",
+    "search_author": "search_author QUERY",
+    "display_books": "display_books",
+    "add_student": "add_student NAME STUDENT_ID",
+    "delete_student": "delete_student NAME STUDENT_ID",
+    "search_student": "search_student NAME",
+    "display_students": "display_students",
+    "rent": "rent STUDENT_ID BOOK_ID [STUDENT_NAME]",
+    "return": "return STUDENT_ID BOOK_ID [STUDENT_NAME]",
+    "renew": "renew STUDENT_ID BOOK_ID [STUDENT_NAME]",
+    "search_rentals": "search_rentals STUDENT_ID",
+    "holders": "holders BOOK_ID",
+    "display_rentals": "display_rentals",
+    "overdue": "overdue",
+    "due_this_week": "due_this_week",
+    "report": "report",
+    "author": "author AUTHOR",
+    "import_books": "import_books CSV_PATH",
+    "import_students": "import_students CSV_PATH",
+    "batch": "batch rent|return CSV_PATH",
+    "export": "export books|students|rentals PATH [csv|jsonl]",
+    "stats": "stats",
+    "checkpoint": "checkpoint",
+    "compact": "compact",
+}
+
+
+class CommandRunner:
+    # runs menu operations from lines such as `rent 101 10001`, one command per line, without prompts.
+    # changes are saved at the end and at every `checkpoint` command instead of after each command
+    def __init__(self, library):
+        self.library = library
+        self.commands = 0
+        self.failed = 0
+        self.errors = []
+        self.counts = {}
+
+    def run(self, lines):
+        start = time.perf_counter()
+        with self.library.deferred_saves():
+            for line_number, line in enumerate(lines, 1):
+                self.run_line(line_number, line)
+        return {
+            "commands": self.commands,
+            "ok": self.commands - self.failed - len(self.errors),
+            "failed": self.failed,
+            "errors": len(self.errors),
+            "error_lines": [{"line": line_number, "command": line, "error": error}
+                            for line_number, line, error in self.errors[:100]],
+            "by_command": self.counts,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def run_line(self, line_number, line):
+        try:
+            words = shlex.split(line, comments=True)
+        except ValueError as error:
+            self.commands += 1
+            self.errors.append((line_number, line.strip(), str(error)))
+            return
+        if not words:
+            return
+        self.commands += 1
+        name, args = words[0].lower(), words[1:]
+        method = getattr(self, "command_" + name, None)
+        if method is None:
+            self.errors.append((line_number, line.strip(), f"unknown command '{name}'"))
+            return
+        self.counts[name] = self.counts.get(name, 0) + 1
+        try:
+            # commands return False when the library refused the operation, e.g. a book out of stock
+            if method(*args) is False:
+                self.failed += 1
+        except (TypeError, ValueError, OSError) as error:
+            self.errors.append((line_number, line.strip(), f"{error}, usage: {USAGE[name]}"))
+
+    def student_name(self, student_id, name):
+        # the name may be left out for a student in the database
+        return " ".join(name) or self.library.student_dict.get(str(student_id), "")
+
+    def command_add_book(self, name, author, quantity):
+        self.library.new_book(name, author, int(quantity))
+
+    def command_remove_book(self, book_id, quantity):
+        return self.library.remove_book(int(book_id), int(quantity))
+
+    def command_search_book(self, book_id):
+        return self.library.search_book(int(book_id))
+
+    def command_search_title(self, *query):
+        self.library.search_book_by_title(" ".join(query))
+
+    def command_search_author(self, *query):
+        self.library.search_book_by_author(" ".join(query))
+
+    def command_display_books(self):
+        self.library.print_books()
+
+    def command_add_student(self, name, student_id):
+        return self.library.add_student(name, int(student_id))
+
+    def command_delete_student(self, name, student_id):
+        return self.library.delete_student(name, int(student_id))
+
+    def command_search_student(self, *name):
+        self.library.search_student_by_name(" ".join(name))
+
+    def command_display_students(self):
+        self.library.display_students()
+
+    def command_rent(self, student_id, book_id, *name):
+        return self.library.add_rental(self.student_name(student_id, name), student_id, int(book_id))
+
+    def command_return(self, student_id, book_id, *name):
+        return self.library.return_rental(self.student_name(student_id, name), student_id, int(book_id))
+
+    def command_renew(self, student_id, book_id, *name):
+        return self.library.renew_rental(self.student_name(student_id, name), student_id, int(book_id))
+
+    def command_search_rentals(self, student_id):
+        self.library.search_rentals(student_id)
+
+    def command_holders(self, book_id):
+        self.library.search_book_holders(int(book_id))
+
+    def command_display_rentals(self):
+        self.library.display_rentals()
+
+    def command_overdue(self):
+        self.library.print_due_rentals("Overdue rentals", self.library.overdue_rentals())
+
+    def command_due_this_week(self):
+        self.library.print_due_rentals("Rentals due this week", self.library.rentals_due_this_week())
+
+    def command_report(self):
+        self.library.print_inventory_report()
+
+    def command_author(self, *author):
+        self.library.print_author_copies(" ".join(author))
+
+    def command_import_books(self, csv_path):
+        self.library.import_books_csv(csv_path)
+
+    def command_import_students(self, csv_path):
+        self.library.import_students_csv(csv_path)
+
+    def command_batch(self, action, csv_path):
+        if action not in ("rent", "return"):
+            raise ValueError(f"unknown batch action '{action}'")
+        return self.library.rental_batch_csv(action, csv_path)
+
+    def command_export(self, kind, path, file_format="csv"):
+        count = self.library.export(kind, path, file_format)
+        print(f"Exported {count} {kind} to '{path}'.")
+
+    def command_stats(self):
+        self.library.print_stats()
+
+    def command_checkpoint(self):
+        # write everything changed so far
+        self.library.flush()
+
+    def command_compact(self):
+        self.library.flush()
+        self.library.compact_journal()
+
+
+def run_command_file(library, path, quiet=False):
+    # run the commands in path ('-' for stdin) and print a JSON summary as the last line;
+    # returns None without running anything when the file cannot be opened
+    try:
+        source = contextlib.nullcontext(sys.stdin) if path == "-" else open(path, 'r')
+    except OSError as error:
+        print(f"Cannot read commands from '{path}': {error.strerror}.")
+        return None
+    # messages go through a large buffer instead of being written line by line
+    output = open(sys.stdout.fileno(), 'w', buffering=1024 * 1024, closefd=False)
+    sink = open(os.devnull, 'w') if quiet else contextlib.nullcontext(output)
+    with source as file, sink as messages, contextlib.redirect_stdout(messages):
+        summary = CommandRunner(library).run(file)
+    output.write(json.dumps(summary) + "\n")
+    output.flush()
+    return summary
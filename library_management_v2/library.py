@@ -1,42 +1,470 @@
+import argparse
+import bisect
+import csv
+import itertools
+import json
 import random
 import string
-import os
+from contextlib import contextmanager
+from datetime import date, timedelta
+from operator import itemgetter
+
+from aggregates import Aggregates
+from chunked_loader import paused_gc
+from commands import run_command_file
+from records import Book
+from search_index import SearchIndex
+from stats import enable_stats
+from storage import open_storage
 
 
 class Library:
-    def __init__(self, file_path):
+    def __init__(self, file_path, journal_mode=False, compact_threshold=10000, binary=False, storage="text",
+                 stats=False, load_workers=None, loan_days=14):
         self.rentals_dict = {}
         self.student_dict = {}
         self.book_dict = {}
         self.book_file_path = file_path
+        # the storage reads and writes the data (see storage.py): text files, the memory mapped
+        # binary files that decode books and students only when accessed, or a sqlite database
+        if binary:
+            storage = "binary"
+        self.storage = open_storage(storage, file_path, load_workers) if isinstance(storage, str) else storage
+        # in journal mode every change is appended to the journal instead of rewriting the data files;
+        # a database already writes single rows, so it has no journal
+        self.journal_mode = journal_mode and not self.storage.row_updates
+        self.journal_path = self.storage.journal_path
+        self.compact_threshold = compact_threshold
+        self.journal_entries = 0
+        self.last_book_id = 0
+        # a rental is due this many days after it is rented or renewed
+        self.loan_days = loan_days
+        # while saves are deferred, changes collect here and are written once by flush()
+        self.deferred = 0
+        self.pending_records = []
+        self.dirty_files = set()
+        # writers take the lock, and a data file that another process replaced since it was read
+        # is reloaded and merged with the changes made here before it is written again
+        self.lock = self.storage.lock
+        self.book_changes = {}
+        self.created_books = set()
+        self.student_changes = set()
+        self.rental_changes = []
+        # stats are collected only when asked for (see stats.py), so the loads below are measured too
+        self.stats = None
+        if stats:
+            enable_stats(self)
+        self.build_indexes()
         self.load_books()
         self.load_students()
         self.load_rentals()
-        self.last_book_id = max(self.book_dict.keys(), default=0)
+        self.replay_journal()
+        self.last_book_id = self.storage.last_book_id(self.book_dict)
         # create txt files
-        for filename in ["library_data.txt", "rentals.txt", "students.txt"]:
-            if not os.path.isfile(filename):
-                open(filename, "w").close()
+        self.storage.create_files()
 
-    def load_books(self):
+    def build_indexes(self):
+        # sorted indexes are built the first time they are used and then kept up to date on every
+        # insert and delete, so lookups never re-sort and opening a large catalog stays fast
+        self._book_ids = None
+        self._title_ids = None
+        self.reset_student_indexes()
+        # the full text indexes are only built the first time a title or author search runs
+        self.title_index = None
+        self.author_index = None
+        # so are the inventory aggregates for the reports
+        self._aggregates = None
+
+    def reset_student_indexes(self):
+        self._student_ids = None
+        self._student_names = None
+
+    @property
+    def book_ids(self):
+        if self._book_ids is None:
+            self._book_ids = sorted(self.book_dict.keys())
+        return self._book_ids
+
+    @property
+    def title_ids(self):
+        # lowercase title -> book id, keeping the first book like the old duplicate scan did
+        if self._title_ids is None:
+            self._title_ids = {}
+            for book_id, book in self.book_dict.items():
+                self._title_ids.setdefault(book['name'].lower(), book_id)
+        return self._title_ids
+
+    @property
+    def student_ids(self):
+        if self._student_ids is None:
+            self._student_ids = sorted(self.student_dict.keys())
+        return self._student_ids
+
+    @property
+    def student_names(self):
+        if self._student_names is None:
+            self._student_names = sorted((name.lower(), student_id)
+                                         for student_id, name in self.student_dict.items())
+        return self._student_names
+
+    @property
+    def aggregates(self):
+        if self._aggregates is None:
+            self._aggregates = Aggregates.build(self.book_dict, self.rentals_dict)
+        return self._aggregates
+
+    def build_text_indexes(self):
+        self.title_index = SearchIndex()
+        self.title_index.add_many((book_id, book['name']) for book_id, book in self.book_dict.items())
+        self.author_index = SearchIndex()
+        self.author_index.add_many((book_id, book['author']) for book_id, book in self.book_dict.items())
+
+    def index_book(self, book_id):
+        book = self.book_dict[book_id]
+        self.index_insert(self._book_ids, book_id)
+        if self._title_ids is not None:
+            self._title_ids.setdefault(book['name'].lower(), book_id)
+        if self.title_index is not None:
+            self.title_index.add(book_id, book['name'])
+            self.author_index.add(book_id, book['author'])
+        if self._aggregates is not None:
+            self._aggregates.add_book(book_id, book)
+
+    def unindex_book(self, book_id, book=None):
+        # book is given when it is no longer the one in book_dict, e.g. after the books were read again
+        if book is None:
+            book = self.book_dict[book_id]
+        self.index_remove(self._book_ids, book_id)
+        if self._title_ids is not None and self._title_ids.get(book['name'].lower()) == book_id:
+            del self._title_ids[book['name'].lower()]
+        if self.title_index is not None:
+            self.title_index.remove(book_id, book['name'])
+            self.author_index.remove(book_id, book['author'])
+        if self._aggregates is not None:
+            self._aggregates.remove_book(book_id, book)
+
+    @staticmethod
+    def index_insert(index, item):
+        # an index that has not been built yet will pick the change up when it is built
+        if index is None:
+            return
+        position = bisect.bisect_left(index, item)
+        if position == len(index) or index[position] != item:
+            index.insert(position, item)
+
+    @staticmethod
+    def index_remove(index, item):
+        if index is None:
+            return
+        position = bisect.bisect_left(index, item)
+        if position < len(index) and index[position] == item:
+            del index[position]
+
+    def replay_journal(self):
+        # apply the changes recorded since the last compaction on top of the data files
+        if self.journal_path is None:
+            return
+        self.journal_entries = self.apply_journal()
+        # a journal left behind by journal mode is folded back into the data files
+        if self.journal_entries and not self.journal_mode:
+            self.compact_journal()
+
+    def apply_journal(self):
+        # apply every record in the journal file and return how many were valid
+        entries = 0
         try:
-            # open file
-            with open("library_data.txt", 'r') as file:
-                lines = file.readlines()
-                for line in lines:
-                    book_id, name, author, quantity = line.strip().split(',')
-                    # create a dictionary in book_dict w/ book_id as key
-                    book_id = int(book_id)
-                    self.book_dict[book_id] = {"name": name, "author": author, "quantity": int(quantity)}
+            with open(self.journal_path, 'r') as file:
+                for line in file:
+                    record = line.rstrip("\n").split(',')
+                    if self.apply_record(record):
+                        entries += 1
+                    else:
+                        print(f"Ignoring line in journal file: {line.strip()}. It does not contain valid data.")
         except FileNotFoundError:
-            self.book_dict = {}
+            pass
+        return entries
+
+    def apply_record(self, record):
+        # every record holds the resulting state, so applying a record twice gives the same result
+        action = record[0]
+        try:
+            if action == "book" and len(record) == 5:
+                self.book_dict[int(record[1])] = Book(record[2], record[3], record[4])
+            elif action == "delete_book" and len(record) == 2:
+                self.book_dict.pop(int(record[1]), None)
+            elif action == "student" and len(record) == 3:
+                self.student_dict[record[1]] = record[2]
+            elif action == "delete_student" and len(record) == 2:
+                self.student_dict.pop(record[1], None)
+            elif action == "rent" and len(record) in (4, 6):
+                self.add_rental_entry(record[1], record[2], int(record[3]), *map(parse_date, record[4:]))
+            elif action == "return" and len(record) == 4:
+                self.remove_rental_entry(record[1], record[2], int(record[3]))
+            elif action == "renew" and len(record) == 5:
+                rental = (record[1], record[2], int(record[3]))
+                if rental[2] in self.rentals_dict.get(rental[:2], ()):
+                    rented = self.rental_dates.get(rental, (None, None))[0]
+                    self.set_rental_dates(*rental, rented, parse_date(record[4]))
+            else:
+                return False
+        except ValueError:
+            return False
+        return True
+
+    def write_journal(self, *records):
+        text = "".join(",".join(str(field) for field in record) + "\n" for record in records)
+        with self.lock, open(self.journal_path, 'a') as file:
+            file.write(text)
+        self.journal_entries += len(records)
+        if self.stats is not None:
+            self.stats.record_bytes("written", self.journal_path, len(text.encode()))
+        # fold the journal back into the data files once it grows past the threshold
+        if self.journal_entries >= self.compact_threshold:
+            self.compact_journal()
+
+    def compact_journal(self, records=()):
+        # records are changes that were never written to the journal, e.g. a large deferred batch
+        if self.journal_path is None:
+            self.commit()
+            return
+        if not self.journal_mode and self.dirty_files:
+            self.flush()
+        records = self.pending_records + list(records)
+        self.pending_records = []
+        with self.lock:
+            self.reload_with_journal(records)
+            for name in ("books", "students", "rentals"):
+                self.save_file(name)
+            self.dirty_files = set()
+            # records are idempotent, so a crash before truncating only replays changes already saved
+            open(self.journal_path, 'w').close()
+        self.journal_entries = 0
+
+    def reload_with_journal(self, records=()):
+        # other processes may have replaced the data files or appended to the shared journal since they
+        # were read here, so everything is read again the way a new process would see it. the changes
+        # made here are in the journal too, apart from the records passed in, which go on top
+        old_books = self.book_dict
+        self.load_books()
+        self.load_students()
+        self.load_rentals()
+        self.apply_journal()
+        for record in records:
+            self.apply_record(record)
+        self.reindex_books(old_books)
+        self.reset_student_indexes()
+        self.last_book_id = max(self.last_book_id, self.storage.last_book_id(self.book_dict))
+
+    def persist(self, records, files):
+        # journal mode appends the records, otherwise the touched data files are rewritten;
+        # a database applies the records as row updates and commits them
+        if self.storage.row_updates:
+            self.storage.write_records(records)
+            if self.deferred:
+                # the rows are written but not committed until flush(), which dirty_files asks for
+                self.dirty_files.update(files)
+            else:
+                self.commit()
+        elif self.deferred:
+            if self.journal_mode:
+                self.pending_records.extend(records)
+            self.dirty_files.update(files)
+        elif self.journal_mode:
+            self.write_journal(*records)
+        else:
+            self.save_files(files)
+
+    def save_files(self, names):
+        with self.lock:
+            self.merge_disk_changes(names)
+            for name in names:
+                self.save_file(name)
+
+    def save_file(self, name):
+        # once a file is written the changes it holds no longer need merging
+        if name == "books":
+            self.save_books()
+            self.book_changes = {}
+            self.created_books = set()
+        elif name == "students":
+            self.save_students()
+            self.student_changes = set()
+        elif name == "rentals":
+            self.save_rentals()
+            self.rental_changes = []
+
+    def merge_disk_changes(self, names):
+        if "books" in names and self.storage.changed_on_disk("books"):
+            self.merge_books()
+        if "students" in names and self.storage.changed_on_disk("students"):
+            self.merge_students()
+            self.reset_student_indexes()
+        if "rentals" in names and self.storage.changed_on_disk("rentals"):
+            self.merge_rentals()
+
+    def reindex_books(self, old_books):
+        # after the books were read again the sorted indexes are built again on first use, while the
+        # text indexes and aggregates, which take long to build, only follow the books that changed
+        self._book_ids = None
+        self._title_ids = None
+        if self.title_index is None and self._aggregates is None:
+            return
+        for book_id, book in old_books.items():
+            new_book = self.book_dict.get(book_id)
+            if new_book is None or (new_book['name'], new_book['author']) != (book['name'], book['author']):
+                self.unindex_book(book_id, book)
+            elif new_book['quantity'] != book['quantity'] and self._aggregates is not None:
+                self._aggregates.change_quantity(book_id, new_book, int(new_book['quantity']) - int(book['quantity']))
+        for book_id, book in self.book_dict.items():
+            old_book = old_books.get(book_id)
+            if old_book is None or (old_book['name'], old_book['author']) != (book['name'], book['author']):
+                self.index_book(book_id)
+
+    def merge_books(self):
+        # reload the books written by another process and apply the quantity changes made here
+        ours = self.book_dict
+        self.load_books()
+        titles = {}
+        for book_id, book in self.book_dict.items():
+            titles.setdefault(book['name'].lower(), book_id)
+        for book_id, delta in self.book_changes.items():
+            book = ours.get(book_id)
+            if book is None:
+                # removed here
+                self.book_dict.pop(book_id, None)
+            elif book_id in self.created_books:
+                # a book added here may have been added by the other process too, or its id taken
+                existing_book = titles.get(book['name'].lower())
+                if existing_book is not None:
+                    self.book_dict[existing_book]['quantity'] += delta
+                    self.rename_book(book_id, existing_book)
+                elif book_id in self.book_dict:
+                    new_id = max(self.last_book_id, max(self.book_dict.keys())) + 1
+                    self.book_dict[new_id] = book
+                    self.rename_book(book_id, new_id)
+                else:
+                    self.book_dict[book_id] = book
+            elif book_id in self.book_dict:
+                self.book_dict[book_id]['quantity'] += delta
+                if self.book_dict[book_id]['quantity'] < 0:
+                    print(f"Warning: book with ID '{book_id}' is oversold after merging changes from another process.")
+            # a book removed by the other process stays removed
+        self.last_book_id = max(self.last_book_id, max(self.book_dict.keys(), default=0))
+        self.reindex_books(ours)
+
+    def rename_book(self, old_id, new_id):
+        if old_id == new_id:
+            return
+        print(f"Book with ID '{old_id}' was saved by another process as ID '{new_id}'.")
+        self.last_book_id = max(self.last_book_id, new_id)
+        for student_name, student_id in list(self.book_holders.get(old_id, ())):
+            dates = self.rental_dates.get((student_name, student_id, old_id), ())
+            self.remove_rental_entry(student_name, student_id, old_id)
+            self.add_rental_entry(student_name, student_id, new_id, *dates)
+        self.rental_changes = [record[:3] + (new_id if record[3] == old_id else record[3],) + record[4:]
+                               for record in self.rental_changes]
+
+    def merge_students(self):
+        ours = self.student_dict
+        self.load_students()
+        for student_id in self.student_changes:
+            if student_id in ours:
+                self.student_dict[student_id] = ours[student_id]
+            else:
+                self.student_dict.pop(student_id, None)
+
+    def merge_rentals(self):
+        self.load_rentals()
+        for record in self.rental_changes:
+            self.apply_record(record)
+
+    def flush(self):
+        records, files = self.pending_records, self.dirty_files
+        self.pending_records = []
+        self.dirty_files = set()
+        if self.storage.row_updates:
+            self.commit()
+        elif self.journal_mode:
+            # a batch too big for the journal goes straight into the data files
+            if self.journal_entries + len(records) >= self.compact_threshold:
+                self.compact_journal(records)
+            elif records:
+                self.write_journal(*records)
+        elif files:
+            self.save_files([name for name in ("books", "students", "rentals") if name in files])
+
+    def commit(self):
+        # committed rows never need merging, so the change tracking is dropped like after a save
+        self.storage.commit()
+        self.book_changes = {}
+        self.created_books = set()
+        self.student_changes = set()
+        self.rental_changes = []
+
+    @contextmanager
+    def deferred_saves(self):
+        # group many changes into a single write of each touched file
+        self.deferred += 1
+        try:
+            yield
+        finally:
+            self.deferred -= 1
+            if not self.deferred:
+                self.flush()
+
+    def book_record(self, book_id):
+        if book_id in self.book_dict:
+            book = self.book_dict[book_id]
+            return "book", book_id, book['name'], book['author'], book['quantity']
+        return "delete_book", book_id
+
+    def track_book(self, book_id, delta, created=False):
+        # quantity change since the books file was last written, used to merge with other processes
+        self.book_changes[book_id] = self.book_changes.get(book_id, 0) + delta
+        if created:
+            self.created_books.add(book_id)
+        # every quantity change passes through here, so the aggregates follow it too; added and
+        # removed books were already counted by index_book and unindex_book
+        elif self._aggregates is not None and book_id in self.book_dict:
+            self._aggregates.change_quantity(book_id, self.book_dict[book_id], delta)
+
+    def log_book(self, book_id, delta=0, created=False):
+        self.track_book(book_id, delta, created)
+        self.persist([self.book_record(book_id)], ["books"])
+
+    def log_student(self, student_id):
+        self.student_changes.add(student_id)
+        if student_id in self.student_dict:
+            record = "student", student_id, self.student_dict[student_id]
+        else:
+            record = "delete_student", student_id
+        self.persist([record], ["students"])
+
+    def rental_record(self, action, student_name, student_id, book_id):
+        # rent records carry the rented and due dates when the rental has them
+        dates = self.rental_dates.get((student_name, student_id, book_id))
+        if action == "rent" and dates is not None:
+            return action, student_name, student_id, book_id, format_date(dates[0]), format_date(dates[1])
+        return action, student_name, student_id, book_id
+
+    def log_rental(self, action, student_name, student_id, book_id):
+        # a rental also changes the quantity of the book
+        self.track_book(book_id, -1 if action == "rent" else 1)
+        record = self.rental_record(action, student_name, student_id, book_id)
+        self.rental_changes.append(record)
+        self.persist([record, self.book_record(book_id)], ["rentals", "books"])
+
+    def load_books(self):
+        self.book_dict = self.storage.load_books()
 
     def save_books(self):
-        with open("library_data.txt", 'w') as file:
-            # goes through each key value pair in the book_dict
-            for book_id, info in self.book_dict.items():
-                # write line to the file with the book information
-                file.write(f"{book_id},{info['name']},{info['author']},{info['quantity']}\n")
+        self.storage.save_books(self.book_dict)
+
+    def find_title(self, name):
+        # id of the first book with this title in any case, or None
+        if self.storage.indexed_search:
+            return self.storage.find_title(name)
+        return self.title_ids.get(name.lower())
 
     def new_book(self, name, author, quantity):
         author = author.strip()
@@ -46,7 +474,7 @@ class Library:
         book_id = self.last_book_id
 
         # check if there is an existing book
-        existing_book = next((id for id, book in self.book_dict.items() if book['name'].lower() == name.lower()), None)
+        existing_book = self.find_title(name)
         if existing_book:
             # increase quantity by its quantity
             self.book_dict[existing_book]['quantity'] += int(quantity)
@@ -55,50 +483,53 @@ class Library:
                 f"{self.book_dict[existing_book]['quantity']}.")
         else:
             # if no existing book then add a new entry to book_dict
-            self.book_dict[book_id] = {"name": name, "author": author, "quantity": int(quantity)}
+            self.book_dict[book_id] = Book(name, author, quantity)
+            self.index_book(book_id)
             print(f"Book '{name}' by {author} (ID: {book_id}) added successfully with quantity {quantity}.")
-        self.save_books()
+        self.log_book(existing_book or book_id, int(quantity), created=not existing_book)
 
-    def remove_book(self, book_id):
+    def remove_book(self, book_id, quantity_to_remove=None):
         # check id the book_id exists in the book_dict
         if book_id in self.book_dict:
             # retrieve information from book_dict
             book_title = self.book_dict[book_id]['name']
             current_quantity = int(self.book_dict[book_id]['quantity'])
             try:
-                quantity_to_remove = int(input(
-                    f"Enter the quantity of '{book_title}' with ID '{book_id}' to remove "
-                    f"(currently {current_quantity}): "))
+                # the quantity is asked for unless the caller already knows it
+                if quantity_to_remove is None:
+                    quantity_to_remove = input(
+                        f"Enter the quantity of '{book_title}' with ID '{book_id}' to remove "
+                        f"(currently {current_quantity}): ")
+                quantity_to_remove = int(quantity_to_remove)
                 if 0 < quantity_to_remove <= current_quantity:
                     if quantity_to_remove == current_quantity:
+                        self.unindex_book(book_id)
                         del self.book_dict[book_id]
                     else:
                         self.book_dict[book_id]['quantity'] -= quantity_to_remove
                     print(
                         f"{quantity_to_remove} copies of book '{book_title}' with ID '{book_id}' removed successfully.")
-                    self.save_books()
+                    self.log_book(book_id, -quantity_to_remove)
+                    return True
                 else:
                     print("Invalid quantity. Please enter a valid quantity.")
             except ValueError:
                 print("Invalid quantity. Please enter a valid number.")
         else:
             print("Book not found in the library.")
+        return False
 
     def binary_search_books(self, book_id):
         book_id = int(book_id)
-        # sort dictionary
-        sorted_keys = sorted(self.book_dict.keys())
-        low = 0
-        high = len(sorted_keys) - 1
-
-        while low <= high:
-            mid = (low + high) // 2
-            if sorted_keys[mid] == book_id:
-                return self.book_dict[book_id]
-            elif sorted_keys[mid] < book_id:
-                low = mid + 1
-            else:
-                high = mid - 1
+        # a memory mapped catalog is binary searched in the file until the id index is built
+        if self.storage.lazy and self._book_ids is None:
+            return self.book_dict[book_id] if book_id in self.book_dict else -1
+        # binary search the sorted book id index
+        if self.stats is not None:
+            self.stats.record_scan("binary_search_books", len(self.book_ids).bit_length())
+        position = bisect.bisect_left(self.book_ids, book_id)
+        if position < len(self.book_ids) and self.book_ids[position] == book_id:
+            return self.book_dict[book_id]
         return -1
 
     def search_book(self, book_id):
@@ -106,36 +537,82 @@ class Library:
         book = self.binary_search_books(book_id)
         if book != -1:
             print(f"Book '{book['name']}' by {book['author']}, Quantity: {book['quantity']}")
+            return True
+        print("Book not found in the library.")
+        return False
+
+    def search_books_by_text(self, field, query, limit=10):
+        # ranked (book_id, score) matches for the title or author field
+        # a database is also written by other processes, so its token indexes are built again after
+        # they commit; the text and binary files are only read once
+        if self.title_index is None or self.storage.row_updates and self.storage.changed_on_disk("books"):
+            self.build_text_indexes()
+        index = self.title_index if field == "name" else self.author_index
+        matches = index.search(query, limit)
+        if self.stats is not None:
+            self.stats.record_scan("search_books_by_text", index.last_scanned)
+        return matches
+
+    def search_book_by_title(self, query, limit=10):
+        self.print_text_matches(query, self.search_books_by_text("name", query, limit))
+
+    def search_book_by_author(self, query, limit=10):
+        self.print_text_matches(query, self.search_books_by_text("author", query, limit))
+
+    def print_text_matches(self, query, matches):
+        if matches:
+            print(f"Books matching '{query.strip()}':")
+            for book_id, score in matches:
+                info = self.book_dict[book_id]
+                print(f"Book ID: {book_id}, Name: '{info['name']}' by {info['author']}, Quantity: {info['quantity']}")
         else:
-            print("Book not found in the library.")
+            print("No matching books found in the library.")
 
-    def print_books(self):
+    def iter_books(self, offset=0, limit=None, after_id=None):
+        # yields (book_id, book) in id order; after_id continues from the last id of a previous page,
+        # and offset skips that many more, like in iter_rentals
+        start = offset
+        if after_id is not None:
+            start += bisect.bisect_right(self.book_ids, int(after_id))
+        stop = None if limit is None else start + limit
+        for book_id in itertools.islice(self.book_ids, start, stop):
+            yield book_id, self.book_dict[book_id]
+
+    def print_books(self, page_size=None):
         print("Books in the library:")
         if self.book_dict:
-            for book_id, info in sorted(self.book_dict.items()):
-                print(f"Book ID: {book_id}, Name: '{info['name']}' by {info['author']}, Quantity: {info['quantity']}")
+            self.print_pages((f"Book ID: {book_id}, Name: '{info['name']}' by {info['author']}, "
+                              f"Quantity: {info['quantity']}" for book_id, info in self.iter_books()), page_size)
         else:
             print("No books in the library.")
 
+    @staticmethod
+    def print_pages(lines, page_size=None):
+        # print lines a page at a time, asking before each following page
+        if not page_size:
+            for line in lines:
+                print(line)
+            return
+        lines = iter(lines)
+        page_number = 1
+        while True:
+            page = list(itertools.islice(lines, page_size))
+            if not page:
+                break
+            print(f"--- Page {page_number} ---")
+            for line in page:
+                print(line)
+            if len(page) < page_size:
+                break
+            if input("Press Enter for the next page or 'q' to stop: ").strip().lower() == "q":
+                break
+            page_number += 1
+
     def load_students(self):
-        try:
-            with open("students.txt", 'r') as file:
-                lines = file.readlines()
-                # iterate each line in file
-                for line in lines:
-                    if ',' in line:
-                        name, student_id = line.strip().split(',')
-                        # add students name and id to the student_dict
-                        self.student_dict[student_id] = name
-        except FileNotFoundError:
-            self.student_dict = {}
+        self.student_dict = self.storage.load_students()
 
     def save_students(self):
-        with open("students.txt", 'w') as file:
-            # iterate over each key value pair in the student_dict
-            for student_id, name in self.student_dict.items():
-                # write a line to the file w/ student information
-                file.write(f"{name},{student_id}\n")
+        self.storage.save_students(self.student_dict)
 
     def add_student(self, name, student_id):
         name = name.strip()
@@ -145,11 +622,15 @@ class Library:
             print(
                 f"Student with ID '{student_id}' already exists in the list with name "
                 f"'{self.student_dict[student_id]}'.")
+            return False
         else:
             # add student to the student_dict
             self.student_dict[student_id] = name
+            self.index_insert(self._student_ids, student_id)
+            self.index_insert(self._student_names, (name.lower(), student_id))
             print(f"Student '{name}' with ID '{student_id}' added successfully.")
-            self.save_students()
+            self.log_student(student_id)
+            return True
 
     def delete_student(self, name, student_id):
         name = name.strip()
@@ -159,93 +640,145 @@ class Library:
         if self.student_dict.get(student_id) == name:
             # remove from student_dict
             del self.student_dict[student_id]
+            self.index_remove(self._student_ids, student_id)
+            self.index_remove(self._student_names, (name.lower(), student_id))
             print(f"Student '{name}' with ID '{student_id}' removed successfully.")
-            self.save_students()
+            self.log_student(student_id)
+            return True
         else:
             print(f"Student with name '{name}' and ID '{student_id}' not found in the database.")
+            return False
 
     def binary_search_students(self, name):
-        # sort list by student name in lowercase
-        sorted_students = sorted(self.student_dict.items(), key=lambda x: x[1].lower())
-        low = 0
-        high = len(sorted_students) - 1
-        # storing the range of matching names
-        start_index = -1
-        end_index = -1
-
-        while low <= high:
-            mid = (low + high) // 2
-            if sorted_students[mid][1].lower() == name.lower():
-                start_index = mid
-                end_index = mid
-                while start_index > 0 and sorted_students[start_index - 1][1].lower() == name.lower():
-                    start_index -= 1
-                while (end_index < len(sorted_students) - 1 and
-                       sorted_students[end_index + 1][1].lower() == name.lower()):
-                    end_index += 1
-                return start_index, end_index
-            elif sorted_students[mid][1].lower() < name.lower():
-                low = mid + 1
-            else:
-                high = mid - 1
+        # binary search the (lowercase name, student id) index for the range of matching names
+        name = name.lower()
+        start_index = bisect.bisect_left(self.student_names, name, key=itemgetter(0))
+        end_index = bisect.bisect_right(self.student_names, name, key=itemgetter(0)) - 1
+        if start_index > end_index:
+            return -1, -1
         return start_index, end_index
 
+    def find_students(self, name):
+        # (student_id, name) of every student with the name in any case, in id order
+        if self.storage.indexed_search:
+            return self.storage.find_students(name)
+        start_index, end_index = self.binary_search_students(name)
+        if self.stats is not None:
+            # the two binary searches plus the matching names
+            self.stats.record_scan("find_students", 2 * len(self.student_names).bit_length()
+                                   + (end_index - start_index + 1 if start_index != -1 else 0))
+        if start_index == -1:
+            return []
+        return [(student_id, self.student_dict[student_id])
+                for lowered, student_id in self.student_names[start_index:end_index + 1]]
+
     def search_student_by_name(self, name):
         name = name.strip()
-        start_index, end_index = self.binary_search_students(name)
-        sorted_students = sorted(self.student_dict.items(), key=lambda x: x[1].lower())
+        students = self.find_students(name)
 
-        if start_index != -1 and end_index != -1:
+        if students:
             print(f"Students with the name '{name}':")
-            for keys in range(start_index, end_index + 1):
-                print(f"Student Name: {sorted_students[keys][1]}, Student ID: {sorted_students[keys][0]}")
+            for student_id, student_name in students:
+                print(f"Student Name: {student_name}, Student ID: {student_id}")
         else:
             print("Student not found.")
 
-    def display_students(self):
+    def display_students(self, page_size=None):
         if not self.student_dict:
             print("No students in the database.")
             return
 
         print("Students in the database (sorted by ID):")
-        for student_id, name in sorted(self.student_dict.items()):
-            print(f"Name: {name}, ID: {student_id}")
+        self.print_pages((f"Name: {name}, ID: {student_id}" for student_id, name in self.iter_students()), page_size)
+
+    def iter_students(self, offset=0, limit=None, after_id=None):
+        # yields (student_id, name) in id order, paged like iter_books
+        start = offset
+        if after_id is not None:
+            start += bisect.bisect_right(self.student_ids, str(after_id))
+        stop = None if limit is None else start + limit
+        for student_id in itertools.islice(self.student_ids, start, stop):
+            yield student_id, self.student_dict[student_id]
 
     def load_rentals(self):
-        try:
-            with open("rentals.txt", 'r') as file:
-                lines = file.readlines()
-                self.rentals_dict = {}
-                for line in lines:
-                    data = line.strip().split(',')
-                    if len(data) == 3:
-                        # extract data
-                        student_name, student_id, book_id = data
-                        student_id = str(student_id)
-                        book_id = int(book_id)
-                        # check if the rental already exist in the dictionary
-                        if (student_name, student_id) in self.rentals_dict:
-                            # append the book id to the existing list of rentals
-                            self.rentals_dict[(student_name, student_id)].append(book_id)
-                        else:
-                            # if not create a new entry in the dictionary w/ student
-                            self.rentals_dict[(student_name, student_id)] = [book_id]
-                    else:
-                        print(f"Ignoring line in rentals file: {line.strip()}. It does not contain valid data.")
-        except FileNotFoundError:
-            self.rentals_dict = {}
+        # the rentals and their indexes are rebuilt from scratch; the aggregates count the loans again
+        if self._aggregates is not None:
+            self._aggregates.clear_loans()
+        self.rentals_dict = {}
+        self._rental_keys = None
+        self.student_rentals = {}
+        self.book_holders = {}
+        # (rented, due) per (student_name, student_id, book_id); rentals from before due dates have none
+        self.rental_dates = {}
+        self._due_index = None
+        with paused_gc():
+            for student_name, student_id, book_id, rented, due in self.storage.load_rentals():
+                self.add_rental_entry(student_name, student_id, book_id, parse_date(rented), parse_date(due))
+
+    @property
+    def rental_keys(self):
+        # sorted (student_id, student_name) of the students with rentals, built on first use
+        if self._rental_keys is None:
+            self._rental_keys = sorted((student_id, student_name) for student_name, student_id in self.rentals_dict)
+        return self._rental_keys
+
+    @property
+    def due_index(self):
+        # sorted (due, student_id, student_name, book_id), built on first use like the other indexes
+        if self._due_index is None:
+            self._due_index = sorted((due, student_id, student_name, book_id) for (student_name, student_id, book_id),
+                                     (rented, due) in self.rental_dates.items())
+        return self._due_index
+
+    def set_rental_dates(self, student_name, student_id, book_id, rented, due):
+        self.clear_rental_dates(student_name, student_id, book_id)
+        self.rental_dates[(student_name, student_id, book_id)] = (rented, due)
+        self.index_insert(self._due_index, (due, student_id, student_name, book_id))
+
+    def clear_rental_dates(self, student_name, student_id, book_id):
+        dates = self.rental_dates.pop((student_name, student_id, book_id), None)
+        if dates is not None:
+            self.index_remove(self._due_index, (dates[1], student_id, student_name, book_id))
+
+    def add_rental_entry(self, student_name, student_id, book_id, rented=None, due=None):
+        # record the rental in rentals_dict and in the student id and book id indexes
+        key = (student_name, student_id)
+        if key not in self.rentals_dict:
+            self.rentals_dict[key] = set()
+            self.index_insert(self._rental_keys, (student_id, student_name))
+            self.student_rentals.setdefault(student_id, set()).add(student_name)
+        if self._aggregates is not None and book_id not in self.rentals_dict[key]:
+            self._aggregates.add_loan(student_id, book_id)
+        self.rentals_dict[key].add(book_id)
+        self.book_holders.setdefault(book_id, set()).add(key)
+        if due is not None:
+            self.set_rental_dates(student_name, student_id, book_id, rented, due)
+
+    def remove_rental_entry(self, student_name, student_id, book_id):
+        key = (student_name, student_id)
+        if book_id not in self.rentals_dict.get(key, ()):
+            return False
+        self.rentals_dict[key].remove(book_id)
+        # drop the student from the rentals once nothing is left on loan
+        if not self.rentals_dict[key]:
+            del self.rentals_dict[key]
+            self.index_remove(self._rental_keys, (student_id, student_name))
+            self.student_rentals[student_id].discard(student_name)
+            if not self.student_rentals[student_id]:
+                del self.student_rentals[student_id]
+        self.book_holders[book_id].discard(key)
+        if not self.book_holders[book_id]:
+            del self.book_holders[book_id]
+        if self._aggregates is not None:
+            self._aggregates.remove_loan(student_id, book_id)
+        self.clear_rental_dates(student_name, student_id, book_id)
+        return True
 
     def save_rentals(self):
-        with open("rentals.txt", 'w') as file:
-            # iterate over each rental entry in the rental_dict
-            for student_key, book_ids in self.rentals_dict.items():
-                # extract the student name and ID from the dictionary key
-                student_name, student_id = student_key
-                # write a line for each rental entry w/ the information
-                for book_id in book_ids:
-                    file.write(f"{student_name},{student_id},{book_id}\n")
-
-    def add_rental(self, student_name, student_id, book_id):
+        self.storage.save_rentals(self.rentals_dict, self.rental_dates)
+
+    def add_rental(self, student_name, student_id, book_id, check_student=True):
+        # check_student is turned off by branches.py, where the student may be kept by another shard
         student_name = student_name.strip()
         student_id = str(student_id)
         book_id = int(book_id)
@@ -253,120 +786,492 @@ class Library:
         # check if book w/ the given ID exists in the library
         if book_id not in self.book_dict:
             print(f"Book with ID '{book_id}' not found in the library.")
-            return
+            return False
 
         # gather information from book_dict
         book = self.book_dict[book_id]
         book_quantity = int(book['quantity'])
 
         # check if the student w/ the given ID exists in the database
-        if student_id not in self.student_dict:
+        if check_student and student_id not in self.student_dict:
             print("Student not found in the database.")
-            return
+            return False
 
         # check if book is available
         if book_quantity > 0:
-            if (student_name, student_id) not in self.rentals_dict:
-                self.rentals_dict[(student_name, student_id)] = set()
-            elif isinstance(self.rentals_dict[(student_name, student_id)], list):
-                self.rentals_dict[(student_name, student_id)] = set(self.rentals_dict[(student_name, student_id)])
-            self.rentals_dict[(student_name, student_id)].add(book_id)
+            rented = date.today()
+            self.add_rental_entry(student_name, student_id, book_id, rented, rented + timedelta(days=self.loan_days))
             book_quantity -= 1
             self.book_dict[book_id]['quantity'] = book_quantity
-            self.save_rentals()
-            self.save_books()
+            self.log_rental("rent", student_name, student_id, book_id)
             print(
                 f"Book '{book['name']}' with ID '{book_id}' rented to student '{student_name}' "
                 f"with ID '{student_id}'.")
+            return True
         else:
             print("Book is out of stock.")
+            return False
 
     def return_rental(self, student_name, student_id, book_id):
         student_name = student_name.strip()
         student_id = str(student_id)
         book_id = int(book_id)
-        # check if there is a matching rental for provided details
-        if (student_name, student_id) in self.rentals_dict:
-            if book_id in self.rentals_dict[(student_name, student_id)]:
-                # remove the book from the rental list for the student
-                self.rentals_dict[(student_name, student_id)].remove(book_id)
-                # check if book exists in the library
-                if book_id in self.book_dict:
-                    # increase its quantity
-                    self.book_dict[book_id]['quantity'] = int(self.book_dict[book_id]['quantity']) + 1
-                    self.save_rentals()
-                    self.save_books()
-                    print(f"Book with ID '{book_id}' returned by student '{student_name}' with ID '{student_id}'.")
-                    return
-                else:
-                    print(f"Book with ID '{book_id}' not found in the library.")
-                    return
+        # check if there is a matching rental for provided details and remove it
+        if self.remove_rental_entry(student_name, student_id, book_id):
+            # the rental is gone either way, so the return is always written; a book that was
+            # removed from the library meanwhile gets no copy back
+            if book_id in self.book_dict:
+                # increase its quantity
+                self.book_dict[book_id]['quantity'] = int(self.book_dict[book_id]['quantity']) + 1
+                print(f"Book with ID '{book_id}' returned by student '{student_name}' with ID '{student_id}'.")
+            else:
+                print(f"Book with ID '{book_id}' returned by student '{student_name}' with ID '{student_id}', "
+                      f"but it is no longer in the library.")
+            self.log_rental("return", student_name, student_id, book_id)
+            return True
         print("No matching rental found for the provided student and book details.")
+        return False
 
-    def binary_search_rentals(self, student_id):
-        student_id = str(student_id)
-        # sort rental dictionary by student_id
-        sorted_rentals = sorted(self.rentals_dict.keys(), key=lambda x: x[1])
-        low = 0
-        high = len(sorted_rentals) - 1
-
-        while low <= high:
-            mid = (low + high) // 2
-            if sorted_rentals[mid][1] == student_id:
-                return mid
-            elif sorted_rentals[mid][1] < student_id:
-                low = mid + 1
+    def rental_batch(self, action, rentals):
+        # rent or return many (student_name, student_id, book_id) at once, writing the files once.
+        # if any of them cannot be done nothing changes; returns the problems as (row number, rental, reason)
+        pairs = []
+        problems = []
+        seen = set()
+        demand = {}
+        for row_number, rental in enumerate(rentals, 1):
+            try:
+                student_name, student_id, book_id = rental
+                student_id = str(student_id).strip()
+                book_id = int(book_id)
+            except (TypeError, ValueError):
+                problems.append((row_number, rental, "expected student name, student ID and book ID"))
+                continue
+            # the name may be left out for a known student
+            student_name = str(student_name).strip() or self.student_dict.get(student_id, "")
+            pair = (student_name, student_id, book_id)
+            if pair in seen:
+                problems.append((row_number, rental, "listed more than once"))
+                continue
+            if book_id not in self.book_dict:
+                problems.append((row_number, rental, "book not found in the library"))
+                continue
+            if action == "rent" and student_id not in self.student_dict:
+                problems.append((row_number, rental, "student not found in the database"))
+                continue
+            if action == "return" and book_id not in self.rentals_dict.get((student_name, student_id), ()):
+                problems.append((row_number, rental, "no matching rental"))
+                continue
+            demand[book_id] = demand.get(book_id, 0) + 1
+            if action == "rent" and demand[book_id] > int(self.book_dict[book_id]['quantity']):
+                problems.append((row_number, rental, f"out of stock, only {self.book_dict[book_id]['quantity']} "
+                                                     f"copies for {demand[book_id]} rentals"))
+                continue
+            seen.add(pair)
+            pairs.append(pair)
+        if problems:
+            return problems
+
+        # quantities change once per book however many copies the batch moves
+        delta = -1 if action == "rent" else 1
+        rented = date.today()
+        due = rented + timedelta(days=self.loan_days)
+        records = []
+        for student_name, student_id, book_id in pairs:
+            if action == "rent":
+                self.add_rental_entry(student_name, student_id, book_id, rented, due)
             else:
-                high = mid - 1
-        return -1
+                self.remove_rental_entry(student_name, student_id, book_id)
+            records.append(self.rental_record(action, student_name, student_id, book_id))
+        self.rental_changes.extend(records)
+        for book_id, count in demand.items():
+            self.book_dict[book_id]['quantity'] = int(self.book_dict[book_id]['quantity']) + delta * count
+            self.track_book(book_id, delta * count)
+        self.persist(records + [self.book_record(book_id) for book_id in demand], ["rentals", "books"])
+        return []
+
+    def renew_rental(self, student_name, student_id, book_id, days=None):
+        # move the due date loan_days (or days) past the later of the current due date and today
+        student_name = student_name.strip()
+        student_id = str(student_id)
+        book_id = int(book_id)
+        if book_id not in self.rentals_dict.get((student_name, student_id), ()):
+            print("No matching rental found for the provided student and book details.")
+            return False
+        rented, due = self.rental_dates.get((student_name, student_id, book_id), (None, None))
+        due = max(due or date.today(), date.today()) + timedelta(days=self.loan_days if days is None else days)
+        self.set_rental_dates(student_name, student_id, book_id, rented, due)
+        record = ("renew", student_name, student_id, book_id, format_date(due))
+        self.rental_changes.append(record)
+        self.persist([record], ["rentals"])
+        print(f"Rental of book with ID '{book_id}' by student '{student_name}' with ID '{student_id}' "
+              f"renewed until {due}.")
+        return True
+
+    def rentals_due_between(self, start, end):
+        # (due, student_id, student_name, book_id) of the rentals due on start up to the day before end;
+        # two binary searches find the range, so the time depends only on how many rentals match
+        start_index = bisect.bisect_left(self.due_index, (start,))
+        end_index = bisect.bisect_left(self.due_index, (end,))
+        if self.stats is not None:
+            # the two binary searches plus the matching rentals
+            self.stats.record_scan("rentals_due_between", 2 * len(self.due_index).bit_length()
+                                   + end_index - start_index)
+        return self.due_index[start_index:end_index]
+
+    def overdue_rentals(self, today=None):
+        return self.rentals_due_between(date.min, today or date.today())
+
+    def rentals_due_this_week(self, today=None):
+        today = today or date.today()
+        return self.rentals_due_between(today, today + timedelta(days=7))
+
+    def print_due_rentals(self, title, rentals):
+        if not rentals:
+            print(f"{title}: none.")
+            return
+        print(f"{title}:")
+        for due, student_id, student_name, book_id in rentals:
+            book_title = self.book_dict.get(book_id, {}).get('name', "Unknown")
+            print(f"Student Name: {student_name}, Student ID: {student_id}, Book ID: {book_id}, "
+                  f"Book Title: {book_title}, Due: {due}")
+
+    def rental_batch_csv(self, action, csv_path):
+        rentals = list(self.read_csv_rows(csv_path, ["student_name", "student_id", "book_id"]))
+        problems = self.rental_batch(action, rentals)
+        if problems:
+            print(f"No books were {'rented' if action == 'rent' else 'returned'}, "
+                  f"{len(problems)} of {len(rentals)} rows in '{csv_path}' cannot be done.")
+            self.print_rejected(problems)
+            return False
+        print(f"{len(rentals)} books {'rented' if action == 'rent' else 'returned'} from '{csv_path}'.")
+        return True
+
+    def rented_books(self, student_id):
+        # book ids held by the student under any spelling of their name
+        book_ids = []
+        for student_name in self.student_rentals.get(str(student_id), ()):
+            book_ids.extend(self.rentals_dict[(student_name, str(student_id))])
+        if self.stats is not None:
+            self.stats.record_scan("rented_books", len(book_ids))
+        return book_ids
+
+    def book_holders_of(self, book_id):
+        # (student_name, student_id) of everyone holding a copy of the book
+        return sorted(self.book_holders.get(int(book_id), ()), key=itemgetter(1))
 
     def search_rentals(self, student_id):
         student_id = str(student_id)
-        sorted_rentals = sorted(self.rentals_dict.keys(), key=lambda x: x[1])
-        rental = self.binary_search_rentals(student_id)
+        book_ids = self.rented_books(student_id)
 
-        if rental != -1:
+        if book_ids:
             print(f"Rentals for the student with ID '{student_id}':")
-            for book_id in self.rentals_dict[sorted_rentals[rental]]:
+            for book_id in book_ids:
                 book_info = self.book_dict.get(book_id, {})
                 print(f"Book ID: {book_id}, Book Title: {book_info.get('name', 'Unknown')}, "
                       f"Author: {book_info.get('author', 'Unknown')}, Quantity: {book_info.get('quantity', 0)}")
         else:
             print(f"No rentals found for the student with ID '{student_id}'.")
 
-    def display_rentals(self):
+    def search_book_holders(self, book_id):
+        book_id = int(book_id)
+        holders = self.book_holders_of(book_id)
+
+        if holders:
+            book_title = self.book_dict.get(book_id, {}).get('name', "Unknown")
+            print(f"Students holding book '{book_title}' with ID '{book_id}':")
+            for student_name, student_id in holders:
+                print(f"Student Name: {student_name}, Student ID: {student_id}")
+        else:
+            print(f"No students currently hold the book with ID '{book_id}'.")
+
+    def iter_rentals(self, offset=0, limit=None, after=None):
+        # yields (student_name, student_id, book_id) ordered by student id, name and book id;
+        # after is the last (student_id, student_name, book_id) of a previous page
+        start = 0
+        if after is not None:
+            after_id, after_name, after_book = str(after[0]), after[1], int(after[2])
+            start = bisect.bisect_left(self.rental_keys, (after_id, after_name))
+        rentals = self.walk_rentals(start)
+        if after is not None:
+            rentals = itertools.dropwhile(lambda x: (x[1], x[0], x[2]) <= (after_id, after_name, after_book), rentals)
+        stop = None if limit is None else offset + limit
+        yield from itertools.islice(rentals, offset, stop)
+
+    def walk_rentals(self, start):
+        for student_id, student_name in itertools.islice(self.rental_keys, start, None):
+            for book_id in sorted(self.rentals_dict[(student_name, student_id)]):
+                yield student_name, student_id, book_id
+
+    def display_rentals(self, page_size=None):
         if not self.rentals_dict:
             print("No rentals in the database.")
             return
 
         print("Rentals in the database:")
-        for student_info, book_ids in self.rentals_dict.items():
-            student_name, student_id = student_info
+        self.print_pages(self.rental_lines(), page_size)
+
+    def rental_lines(self):
+        for student_name, student_id, book_id in self.iter_rentals():
+            dates = self.rental_dates.get((student_name, student_id, book_id))
             student_name = self.student_dict.get(student_id, student_name)
-            for book_id in book_ids:
-                book_title = self.book_dict.get(book_id, {}).get('name', "Unknown")
-                print(
-                    f"Student Name: {student_name}, Student ID: {student_id}, "
-                    f"Book ID: {book_id}, Book Title: {book_title}")
+            book_title = self.book_dict.get(book_id, {}).get('name', "Unknown")
+            yield (f"Student Name: {student_name}, Student ID: {student_id}, "
+                   f"Book ID: {book_id}, Book Title: {book_title}" + (f", Due: {dates[1]}" if dates else ""))
+
+    def export_rows(self, kind):
+        # header and rows for export; books and students are in the same column order as the csv imports
+        if kind == "books":
+            return (["book_id", "name", "author", "quantity"],
+                    ([book_id, book['name'], book['author'], book['quantity']] for book_id, book in self.iter_books()))
+        if kind == "students":
+            return ["name", "student_id"], ([name, student_id] for student_id, name in self.iter_students())
+        if kind == "rentals":
+            return (["student_name", "student_id", "book_id", "rented_on", "due_on"],
+                    (list(rental) + list(map(format_date, self.rental_dates.get(rental, (None, None))))
+                     for rental in self.iter_rentals()))
+        raise ValueError(f"Unknown export kind '{kind}'. Use books, students or rentals.")
+
+    def export(self, kind, path, file_format="csv"):
+        # stream every row to the file through a write buffer, so memory stays flat for any size
+        header, rows = self.export_rows(kind)
+        count = 0
+        with open(path, 'w', newline='', buffering=1024 * 1024) as file:
+            if file_format == "csv":
+                writer = csv.writer(file)
+                writer.writerow(header)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            elif file_format == "jsonl":
+                for row in rows:
+                    file.write(json.dumps(dict(zip(header, row))) + "\n")
+                    count += 1
+            else:
+                raise ValueError(f"Unknown export format '{file_format}'. Use csv or jsonl.")
+        return count
+
+    def import_books(self, rows):
+        # rows of (name, author, quantity); returns (added, merged, rejected) with rejected rows
+        # as (row number, row, reason). every touched book is saved once at the end
+        added = 0
+        merged = 0
+        rejected = []
+        # the text indexes are rebuilt on the next search instead of being updated row by row
+        self.title_index = None
+        self.author_index = None
+        with self.deferred_saves():
+            for row_number, row in enumerate(rows, 1):
+                if len(row) != 3:
+                    rejected.append((row_number, row, "expected name, author and quantity"))
+                    continue
+                name, author, quantity = (field.strip() for field in map(str, row))
+                if not name or not author or ',' in name or ',' in author:
+                    rejected.append((row_number, row, "name and author must be non-empty and contain no commas"))
+                    continue
+                try:
+                    quantity = int(quantity)
+                except ValueError:
+                    rejected.append((row_number, row, "quantity is not a number"))
+                    continue
+                if quantity <= 0:
+                    rejected.append((row_number, row, "quantity must be positive"))
+                    continue
+                # merge quantities into an existing title the same way new_book does
+                existing_book = self.find_title(name)
+                if existing_book:
+                    self.book_dict[existing_book]['quantity'] += quantity
+                    self.log_book(existing_book, quantity)
+                    merged += 1
+                else:
+                    self.last_book_id += 1
+                    self.book_dict[self.last_book_id] = Book(name, author, quantity)
+                    self.index_book(self.last_book_id)
+                    self.log_book(self.last_book_id, quantity, created=True)
+                    added += 1
+        return added, merged, rejected
+
+    def import_students(self, rows):
+        # rows of (name, student_id); returns (added, rejected) like import_books
+        added = 0
+        rejected = []
+        with self.deferred_saves():
+            for row_number, row in enumerate(rows, 1):
+                if len(row) != 2:
+                    rejected.append((row_number, row, "expected name and student ID"))
+                    continue
+                name, student_id = (field.strip() for field in map(str, row))
+                if not name or ',' in name:
+                    rejected.append((row_number, row, "name must be non-empty and contain no commas"))
+                    continue
+                if not student_id.isdigit():
+                    rejected.append((row_number, row, "student ID is not a number"))
+                    continue
+                if student_id in self.student_dict:
+                    rejected.append((row_number, row, f"student ID already belongs to '{self.student_dict[student_id]}'"))
+                    continue
+                self.student_dict[student_id] = name
+                self.log_student(student_id)
+                added += 1
+        # sort the new students into the indexes once instead of inserting them one at a time
+        if added:
+            self.reset_student_indexes()
+        return added, rejected
+
+    @staticmethod
+    def read_csv_rows(csv_path, header):
+        # stream rows from a csv file, skipping a header row that matches the expected columns
+        with open(csv_path, 'r', newline='') as file:
+            for row_number, row in enumerate(csv.reader(file)):
+                if row_number == 0 and [field.strip().lower() for field in row] == header:
+                    continue
+                if row:
+                    yield row
+
+    def import_books_csv(self, csv_path):
+        added, merged, rejected = self.import_books(self.read_csv_rows(csv_path, ["name", "author", "quantity"]))
+        print(f"Imported books from '{csv_path}': {added} added, {merged} merged into existing titles, "
+              f"{len(rejected)} rejected.")
+        self.print_rejected(rejected)
+
+    def import_students_csv(self, csv_path):
+        added, rejected = self.import_students(self.read_csv_rows(csv_path, ["name", "student_id"]))
+        print(f"Imported students from '{csv_path}': {added} added, {len(rejected)} rejected.")
+        self.print_rejected(rejected)
+
+    @staticmethod
+    def print_rejected(rejected, limit=20):
+        for row_number, row, reason in rejected[:limit]:
+            print(f"Rejected row {row_number}: {','.join(map(str, row))} ({reason})")
+        if len(rejected) > limit:
+            print(f"... and {len(rejected) - limit} more rejected rows.")
+
+    def out_of_stock_books(self):
+        return sorted(self.aggregates.out_of_stock)
+
+    def author_totals(self, limit=10):
+        # (author, titles, copies) for the authors with the most copies on the shelves
+        aggregates = self.aggregates
+        return [(author, aggregates.author_titles[author], copies)
+                for author, copies in aggregates.author_copies.top(limit)]
+
+    def top_students(self, limit=10):
+        # (student_id, books on loan) for the students with the most rentals
+        return self.aggregates.student_loans.top(limit)
+
+    def top_books(self, limit=10):
+        # (book_id, copies on loan) for the most rented titles
+        return self.aggregates.book_loans.top(limit)
+
+    def print_inventory_report(self, limit=10):
+        out_of_stock = self.out_of_stock_books()
+        print(f"Books out of stock: {len(out_of_stock)}")
+        for book_id in out_of_stock[:limit]:
+            print(f"Book ID: {book_id}, Name: '{self.book_dict[book_id]['name']}' by {self.book_dict[book_id]['author']}")
+        if len(out_of_stock) > limit:
+            print(f"... and {len(out_of_stock) - limit} more.")
+        print("Authors with the most copies:")
+        for author, titles, copies in self.author_totals(limit):
+            print(f"Author: {author}, Titles: {titles}, Copies: {copies}")
+        print("Students with the most rentals:")
+        for student_id, count in self.top_students(limit):
+            print(f"Student Name: {self.student_dict.get(student_id, 'Unknown')}, Student ID: {student_id}, "
+                  f"Books rented: {count}")
+        print("Most rented books:")
+        for book_id, count in self.top_books(limit):
+            book_title = self.book_dict.get(book_id, {}).get('name', "Unknown")
+            print(f"Book ID: {book_id}, Book Title: {book_title}, Copies rented: {count}")
+
+    def print_author_copies(self, author):
+        author = author.strip()
+        aggregates = self.aggregates
+        if author in aggregates.author_titles:
+            print(f"Author {author} has {aggregates.author_titles[author]} titles with "
+                  f"{aggregates.author_copies.get(author)} copies in the library.")
+        else:
+            print(f"No books by {author} in the library.")
+
+    def print_stats(self):
+        if self.stats is None:
+            print("Stats are off. Start the system with --stats to collect them.")
+            return
+        print("Library stats:")
+        for line in self.stats.report_lines():
+            print(line)
 
     def generate_books(self, num_books):
+        rows = []
         for _ in range(num_books):
             title = ''.join(random.choices(string.ascii_letters, k=random.randint(5, 15)))
             author = ''.join(random.choices(string.ascii_letters, k=random.randint(5, 15)))
             quantity = random.randint(1, 100)
-            self.new_book(title, author, quantity)
+            rows.append((title, author, quantity))
+        added, merged, rejected = self.import_books(rows)
+        print(f"Generated {added} books, {merged} merged into existing titles.")
 
     def generate_students(self, num_students):
+        rows = []
         for _ in range(num_students):
             name_length = random.randint(5, 12)
             name = ''.join(random.choices(string.ascii_letters, k=name_length))
             student_id = ''.join(random.choices(string.digits, k=7))
-            self.add_student(name, student_id)
+            rows.append((name, student_id))
+        added, rejected = self.import_students(rows)
+        print(f"Generated {added} students, {len(rejected)} skipped with duplicate IDs.")
+
+
+def parse_date(text):
+    # rentals store dates as YYYY-MM-DD; an empty field means the rental has no date
+    return date.fromisoformat(text) if text else None
+
+
+def format_date(day):
+    return day.isoformat() if day else ""
+
+
+def read_page_size():
+    page_size = input("Enter page size (leave blank to show everything): ").strip()
+    if not page_size:
+        return None
+    try:
+        return max(1, int(page_size))
+    except ValueError:
+        print("Invalid page size. Showing everything.")
+        return None
 
 
 def main():
-    file_path = "library_data.txt"
-    library = Library(file_path)
+    parser = argparse.ArgumentParser(description="Library Management System")
+    parser.add_argument("--journal", action="store_true",
+                        help="append changes to a journal instead of rewriting the data files")
+    parser.add_argument("--compact-threshold", type=int, default=10000,
+                        help="number of journal records that triggers a compaction")
+    parser.add_argument("--binary", action="store_true",
+                        help="use the memory mapped library_data.bin and students.bin files (see binary_store.py)")
+    parser.add_argument("--storage", choices=["text", "binary", "sqlite"], default="text",
+                        help="where the data is kept: text files, binary files or a sqlite database")
+    parser.add_argument("--data", default="library_data.txt",
+                        help="books file, or the database file for sqlite storage (e.g. library.db)")
+    parser.add_argument("--loan-days", type=int, default=14, help="days until a rented or renewed book is due")
+    parser.add_argument("--commands", metavar="PATH",
+                        help="run the commands in PATH ('-' for stdin) instead of showing the menu, see commands.py")
+    parser.add_argument("--quiet", action="store_true", help="with --commands, print only the JSON summary")
+    parser.add_argument("--load-workers", type=int,
+                        help="processes that parse large data files on startup (default: one per core)")
+    parser.add_argument("--stats", action="store_true",
+                        help="collect call counts, latencies, bytes read and written and records scanned")
+    parser.add_argument("--stats-dump", help="write the stats as JSON to this file every --stats-interval seconds")
+    parser.add_argument("--stats-interval", type=float, default=60.0)
+    args = parser.parse_args()
+
+    library = Library(args.data, journal_mode=args.journal, compact_threshold=args.compact_threshold,
+                      binary=args.binary, storage=args.storage, stats=args.stats or bool(args.stats_dump),
+                      load_workers=args.load_workers, loan_days=args.loan_days)
+    if args.stats_dump:
+        library.stats.start_dump(args.stats_dump, args.stats_interval)
+    if args.commands:
+        summary = run_command_file(library, args.commands, args.quiet)
+        raise SystemExit(1 if summary is None or summary["errors"] else 0)
     # library.generate_books(10000)
     # library.generate_students(10000)
 
@@ -384,6 +1289,20 @@ def main():
         print("10. Return Book")
         print("11. Search Rentals")
         print("12. Display Rentals")
+        print("13. Compact Journal")
+        print("14. Search Book by Title")
+        print("15. Search Book by Author")
+        print("16. Import Books from CSV")
+        print("17. Import Students from CSV")
+        print("18. Search Book Holders")
+        print("19. Export Data")
+        print("20. Show Stats")
+        print("21. Rent or Return Books from File")
+        print("22. Inventory Report")
+        print("23. Copies by Author")
+        print("24. Overdue Rentals")
+        print("25. Rentals Due This Week")
+        print("26. Renew Rental")
         print("0. Quit")
 
         choice = input("Enter your choice: ")
@@ -423,7 +1342,7 @@ def main():
                     continue
             library.search_book(book_id)
         elif choice == "4":
-            library.print_books()
+            library.print_books(read_page_size())
         elif choice == "5":
             name = input("Enter student name: ")
             student_id = input("Enter student ID: ")
@@ -449,7 +1368,7 @@ def main():
             name = input("Enter student name to search: ")
             library.search_student_by_name(name)
         elif choice == "8":
-            library.display_students()
+            library.display_students(read_page_size())
         elif choice == "9":
             name = input("Enter student name: ")
             student_id = input("Enter student ID: ")
@@ -486,7 +1405,76 @@ def main():
                     continue
             library.search_rentals(student_id)
         elif choice == "12":
-            library.display_rentals()
+            library.display_rentals(read_page_size())
+        elif choice == "13":
+            library.compact_journal()
+            print("Journal compacted into the data files.")
+        elif choice == "14":
+            query = input("Enter title or part of a title to search: ")
+            library.search_book_by_title(query)
+        elif choice == "15":
+            query = input("Enter author or part of an author name to search: ")
+            library.search_book_by_author(query)
+        elif choice == "16":
+            csv_path = input("Enter path of the books CSV (name,author,quantity): ")
+            try:
+                library.import_books_csv(csv_path.strip())
+            except OSError as error:
+                print(f"Could not read '{csv_path.strip()}': {error}")
+        elif choice == "17":
+            csv_path = input("Enter path of the students CSV (name,student_id): ")
+            try:
+                library.import_students_csv(csv_path.strip())
+            except OSError as error:
+                print(f"Could not read '{csv_path.strip()}': {error}")
+        elif choice == "18":
+            book_id = input("Enter book ID to search holders: ")
+            try:
+                book_id = int(book_id)
+            except ValueError:
+                print("Invalid input for book ID. Please enter a valid integer.")
+                continue
+            library.search_book_holders(book_id)
+        elif choice == "19":
+            kind = input("Enter what to export (books, students or rentals): ").strip().lower()
+            file_format = input("Enter export format (csv or jsonl): ").strip().lower()
+            path = input("Enter file path to export to: ").strip()
+            try:
+                count = library.export(kind, path, file_format)
+                print(f"Exported {count} {kind} to '{path}'.")
+            except (ValueError, OSError) as error:
+                print(f"Export failed: {error}")
+        elif choice == "20":
+            library.print_stats()
+        elif choice == "21":
+            action = input("Enter rent or return: ").strip().lower()
+            if action not in ("rent", "return"):
+                print("Invalid choice. Please enter rent or return.")
+                continue
+            csv_path = input("Enter path of the batch CSV (student_name,student_id,book_id): ").strip()
+            try:
+                library.rental_batch_csv(action, csv_path)
+            except OSError as error:
+                print(f"Could not read '{csv_path}': {error}")
+        elif choice == "22":
+            library.print_inventory_report()
+        elif choice == "23":
+            author = input("Enter author name: ")
+            library.print_author_copies(author)
+        elif choice == "24":
+            library.print_due_rentals("Overdue rentals", library.overdue_rentals())
+        elif choice == "25":
+            library.print_due_rentals("Rentals due this week", library.rentals_due_this_week())
+        elif choice == "26":
+            name = input("Enter student name: ")
+            student_id = input("Enter student ID: ")
+            book_id = input("Enter book ID to renew: ")
+            try:
+                book_id = int(book_id)
+            except ValueError:
+                print("Invalid input for book ID. Please enter a valid integer.")
+                continue
+            library.renew_rental(name, student_id.strip(), book_id)
         elif choice == "0":
             print("Exiting...")
             break
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def send(reader, writer, request):
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def run_client(host, port, requests, students, book_ids, rng, latencies, counts):
+    # one connection renting, returning and searching in a random mix
+    reader, writer = await asyncio.open_connection(host, port)
+    held = []
+    for _ in range(requests):
+        roll = rng.random()
+        if roll < 0.4 or not held:
+            student = rng.choice(students)
+            request = {"op": "rent", "student_name": student["name"], "student_id": student["student_id"],
+                       "book_id": rng.choice(book_ids)}
+        elif roll < 0.7:
+            student, book_id = held.pop(rng.randrange(len(held)))
+            request = {"op": "return", "student_name": student["name"], "student_id": student["student_id"],
+                       "book_id": book_id}
+        elif roll < 0.9:
+            request = {"op": "search_book", "book_id": rng.choice(book_ids)}
+        else:
+            request = {"op": "list_books", "after": rng.choice(book_ids), "limit": 20}
+        start = time.perf_counter()
+        response = await send(reader, writer, request)
+        latencies.append(time.perf_counter() - start)
+        if request["op"] == "rent" and response["ok"]:
+            held.append((student, request["book_id"]))
+        counts[request["op"]] = counts.get(request["op"], 0) + 1
+    writer.close()
+
+
+async def run_load(host, port, clients, requests, books, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    students = (await send(reader, writer, {"op": "list_students", "limit": 1000}))["students"]
+    # a small pool of books makes clients compete for the same copies
+    book_list = (await send(reader, writer, {"op": "list_books", "limit": books}))["books"]
+    writer.close()
+    if not students or not book_list:
+        print("The server needs at least one student and one book.")
+        return
+    book_ids = [book["book_id"] for book in book_list]
+    latencies = []
+    counts = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, requests, students, book_ids, random.Random(rng.random()),
+                                      latencies, counts) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} requests/s)")
+    print(f"latency p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+    print("requests by op:", counts)
+
+    # no book may end up with a negative quantity however the rentals interleaved
+    reader, writer = await asyncio.open_connection(host, port)
+    for book_id in book_ids:
+        book = (await send(reader, writer, {"op": "search_book", "book_id": book_id}))["book"]
+        if book["quantity"] < 0:
+            print(f"Book {book_id} was oversold: quantity {book['quantity']}")
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--books", type=int, default=20, help="number of books the clients compete for")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.clients, args.requests, args.books, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys
+
+
+class Book:
+    # one book in book_dict; __slots__ keeps it to a few pointers instead of a whole dict per book,
+    # while book['name'], book['quantity'] += 1 and book.get('author') still work like before
+    __slots__ = ("name", "author", "quantity")
+    fields = __slots__
+
+    def __init__(self, name, author, quantity):
+        self.name = name
+        # many books share an author, so every copy of the same author string is stored once
+        self.author = sys.intern(author)
+        self.quantity = int(quantity)
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def __eq__(self, other):
+        if isinstance(other, Book):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"Book(name={self.name!r}, author={self.author!r}, quantity={self.quantity!r})"
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.fields else default
+
+    def keys(self):
+        return list(self.fields)
+
+    def to_dict(self):
+        return {"name": self.name, "author": self.author, "quantity": self.quantity}
@@ -0,0 +1,59 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # advisory locks are only available on unix; elsewhere writes are still atomic but not locked
+    fcntl = None
+
+
+class FileLock:
+    # exclusive advisory lock on a lock file shared by every process using the same data files;
+    # it can be taken again by the same process while already held
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.file = open(self.path, 'a')
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    # write to a temporary file next to path and rename it over path once it is on disk,
+    # so a crash leaves either the old or the new file and never a truncated one
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, mode) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def file_version(path=None, file=None):
+    # identifies one version of a file; a rename replaces the inode, a rewrite changes mtime or size
+    try:
+        stat = os.fstat(file.fileno()) if file is not None else os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
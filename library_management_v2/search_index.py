@@ -0,0 +1,215 @@
+import bisect
+import heapq
+import itertools
+import re
+from operator import itemgetter
+
+# a query word expands to at most this many prefix and this many substring tokens, the shortest ones,
+# which rank highest; a one letter prefix could otherwise expand to a large part of the vocabulary
+MAX_EXPANSIONS = 50
+
+
+class SearchIndex:
+    # inverted index over one text field: token -> ids, plus a sorted vocabulary for prefix
+    # search and a trigram index over the vocabulary for substring and typo tolerant search
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.trigrams = {}
+        self.last_scanned = 0
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r"[a-z0-9]+", text.lower())
+
+    @staticmethod
+    def token_trigrams(token):
+        # pad the token so short tokens and word edges still produce trigrams
+        padded = f"${token}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, doc_id, text):
+        for token in set(self.tokenize(text)):
+            if token not in self.postings:
+                self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+                for gram in self.token_trigrams(token):
+                    self.trigrams.setdefault(gram, set()).add(token)
+            self.postings[token].add(doc_id)
+
+    def add_many(self, documents):
+        # bulk load (doc_id, text) pairs and sort the vocabulary once at the end
+        for doc_id, text in documents:
+            for token in self.tokenize(text):
+                if token not in self.postings:
+                    self.postings[token] = set()
+                    self.vocabulary.append(token)
+                    for gram in self.token_trigrams(token):
+                        self.trigrams.setdefault(gram, set()).add(token)
+                self.postings[token].add(doc_id)
+        self.vocabulary.sort()
+
+    def remove(self, doc_id, text):
+        for token in set(self.tokenize(text)):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                # forget the token once no document uses it
+                del self.postings[token]
+                position = bisect.bisect_left(self.vocabulary, token)
+                del self.vocabulary[position]
+                for gram in self.token_trigrams(token):
+                    tokens = self.trigrams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.trigrams[gram]
+
+    def prefix_tokens(self, prefix, limit=None):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff")
+        tokens = self.vocabulary[start:end]
+        if limit is not None and len(tokens) > limit:
+            tokens = heapq.nsmallest(limit, tokens, key=len)
+        return tokens
+
+    def substring_tokens(self, fragment, limit=None):
+        # every trigram of the fragment must appear in a token that contains it
+        grams = [fragment[i:i + 3] for i in range(len(fragment) - 2)]
+        if not grams:
+            return self.prefix_tokens(fragment, limit)
+        candidate_sets = sorted((self.trigrams.get(gram, set()) for gram in grams), key=len)
+        candidates = set(candidate_sets[0])
+        for tokens in candidate_sets[1:]:
+            candidates &= tokens
+            if not candidates:
+                break
+        tokens = [token for token in candidates if fragment in token]
+        if limit is not None and len(tokens) > limit:
+            tokens = heapq.nsmallest(limit, tokens, key=len)
+        return tokens
+
+    def fuzzy_tokens(self, word, max_distance):
+        # tokens sharing enough trigrams with the word are checked with a bounded edit distance
+        grams = self.token_trigrams(word)
+        shared = {}
+        for gram in grams:
+            for token in self.trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        # one edit changes at most three trigrams, a swap of two letters at most four
+        needed = len(grams) - 4 * max_distance
+        matches = []
+        for token, count in shared.items():
+            if count >= needed and abs(len(token) - len(word)) <= max_distance:
+                distance = edit_distance(word, token, max_distance)
+                if distance <= max_distance:
+                    matches.append((token, distance))
+        return matches
+
+    def token_scores(self, word):
+        # best match quality of every token for one query word
+        scores = {}
+        if word in self.postings:
+            scores[word] = 4.0
+        for token in self.prefix_tokens(word, MAX_EXPANSIONS):
+            scores.setdefault(token, 3.0)
+        if len(word) >= 3:
+            for token in self.substring_tokens(word, MAX_EXPANSIONS):
+                scores.setdefault(token, 2.0)
+        if not scores and len(word) >= 4:
+            for token, distance in self.fuzzy_tokens(word, max(1, len(word) // 4)):
+                scores[token] = 1.0 / (distance + 1)
+        return scores
+
+    def search(self, query, limit=10):
+        # rank ids by how well they match every word of the query, exact > prefix > substring > typo
+        words = self.tokenize(query)
+        # number of postings visited, kept for the stats of the last search
+        self.last_scanned = 0
+        if not words or limit <= 0:
+            return []
+        # (score, token) for every word, best first; shorter tokens are closer to the query word, so rank them first
+        expansions = []
+        for word in words:
+            tokens = [(score + len(word) / len(token) / 10, token) for token, score in self.token_scores(word).items()]
+            if not tokens:
+                return []
+            expansions.append(sorted(tokens, reverse=True))
+        # the word with the fewest postings gives the candidates and the other words are only checked for those
+        order = sorted(range(len(words)), key=lambda position: self.posting_count(expansions[position]))
+        first = order[0]
+        # the best ids so far as (score, -id), the worst of them on top
+        best = []
+        seen = set()
+        # the candidates are taken a group of equal scores at a time, best first and lowest id first within
+        # a group, so the search stops as soon as no remaining candidate can beat the ids found
+        for score, group in itertools.groupby(expansions[first], key=itemgetter(0)):
+            # the highest score an id of this group can reach, added up like total_score does
+            bound = self.total_score(None, first, score, expansions)
+            if len(best) == limit and bound < best[0][0]:
+                break
+            tokens = [token for _, token in group]
+            if len(tokens) == 1 and not seen:
+                ids = list(self.postings[tokens[0]])
+            else:
+                ids = [doc_id for doc_id in set().union(*[self.postings[token] for token in tokens])
+                       if doc_id not in seen]
+            self.last_scanned += len(ids)
+            # a heap gives the lowest ids one at a time without sorting the whole group
+            heapq.heapify(ids)
+            while ids:
+                doc_id = heapq.heappop(ids)
+                if len(best) == limit and (bound, -doc_id) <= best[0]:
+                    # the later ids of the group and every later group score lower
+                    return self.ranked(best)
+                seen.add(doc_id)
+                total = self.total_score(doc_id, first, score, expansions)
+                if total is None:
+                    continue
+                if len(best) < limit:
+                    heapq.heappush(best, (total, -doc_id))
+                elif (total, -doc_id) > best[0]:
+                    heapq.heapreplace(best, (total, -doc_id))
+        return self.ranked(best)
+
+    @staticmethod
+    def ranked(best):
+        return [(-negative_id, total) for total, negative_id in sorted(best, reverse=True)]
+
+    def posting_count(self, tokens):
+        return sum(len(self.postings[token]) for score, token in tokens)
+
+    def total_score(self, doc_id, first, first_score, expansions):
+        # sum of the best score of every word for the id, in query order, or None if a word does not match it;
+        # without an id every word counts its best token
+        total = 0
+        for position, tokens in enumerate(expansions):
+            if position == first:
+                total += first_score
+                continue
+            for score, token in tokens:
+                if doc_id is None or doc_id in self.postings[token]:
+                    total += score
+                    break
+            else:
+                return None
+        return total
+
+
+def edit_distance(first, second, max_distance):
+    # optimal string alignment distance, levenshtein where swapping two neighbouring letters is one edit
+    # ("histroy" -> "history"); stops early once every value in a row is over max_distance
+    before_previous = None
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char))
+            if i > 1 and j > 1 and first_char == second[j - 2] and first[i - 2] == second_char:
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        if min(current) > max_distance and (before_previous is None or min(previous) > max_distance):
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return previous[-1]
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import signal
+
+from library import Library
+
+
+class LibraryServer:
+    # serves one shared Library to many clients over TCP; every request and reply is one JSON line
+    def __init__(self, library, flush_interval=1.0):
+        self.library = library
+        self.flush_interval = flush_interval
+        self.requests_served = 0
+
+    def call(self, method, *args):
+        # run a Library method and return its result with the messages it printed
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = method(*args)
+        return result, output.getvalue().strip()
+
+    async def handle_request(self, request):
+        if not isinstance(request, dict):
+            return {"ok": False, "message": "Bad request: expected a JSON object."}
+        op = request.get("op")
+        library = self.library
+        if op in ("rent", "return"):
+            book_id = int(request["book_id"])
+            student_id = str(request["student_id"])
+            # rent 101 10001 style requests may leave the name out
+            student_name = text_field(request, "student_name") if request.get("student_name") \
+                else library.student_dict.get(student_id, "")
+            method = library.add_rental if op == "rent" else library.return_rental
+            # the Library calls never await, so on the single threaded event loop a rental runs from the
+            # stock check to the update without any other request in between and stock cannot be oversold
+            ok, message = self.call(method, student_name, student_id, book_id)
+            return {"ok": ok, "message": message}
+        if op == "search_book":
+            book = library.binary_search_books(request["book_id"])
+            if book == -1:
+                return {"ok": False, "message": "Book not found in the library."}
+            return {"ok": True, "book": book_json(int(request["book_id"]), book)}
+        if op in ("search_title", "search_author"):
+            field = "name" if op == "search_title" else "author"
+            matches = library.search_books_by_text(field, text_field(request, "query"), int(request.get("limit", 10)))
+            return {"ok": True, "books": [book_json(book_id, library.book_dict[book_id]) for book_id, score in matches]}
+        if op == "search_rentals":
+            book_ids = library.rented_books(request["student_id"])
+            return {"ok": True, "book_ids": book_ids}
+        if op == "book_holders":
+            holders = library.book_holders_of(request["book_id"])
+            return {"ok": True, "holders": [{"student_name": name, "student_id": student_id}
+                                            for name, student_id in holders]}
+        if op == "list_books":
+            books = library.iter_books(int(request.get("offset", 0)), int(request.get("limit", 100)),
+                                       request.get("after"))
+            return {"ok": True, "books": [book_json(book_id, book) for book_id, book in books]}
+        if op == "list_students":
+            students = library.iter_students(int(request.get("offset", 0)), int(request.get("limit", 100)),
+                                             request.get("after"))
+            return {"ok": True, "students": [{"student_id": student_id, "name": name} for student_id, name in students]}
+        if op == "list_rentals":
+            rentals = library.iter_rentals(int(request.get("offset", 0)), int(request.get("limit", 100)),
+                                           request.get("after"))
+            return {"ok": True, "rentals": [{"student_name": name, "student_id": student_id, "book_id": book_id}
+                                            for name, student_id, book_id in rentals]}
+        return {"ok": False, "message": f"Unknown op '{op}'."}
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except (ValueError, KeyError, TypeError, AttributeError) as error:
+                    response = {"ok": False, "message": f"Bad request: {error}"}
+                self.requests_served += 1
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def flush_periodically(self):
+        # changes from all clients are written together once per interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.library.dirty_files or self.library.pending_records:
+                self.library.flush()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"Library server listening on {host}:{port}")
+        # stop serving on ctrl-c or kill so the last changes still get written
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signal_number, asyncio.current_task().cancel)
+        flusher = asyncio.create_task(self.flush_periodically())
+        # saves stay deferred while serving and are written by the flush task and on shutdown
+        with self.library.deferred_saves():
+            try:
+                async with server:
+                    await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+            finally:
+                flusher.cancel()
+        print(f"Server stopped after {self.requests_served} requests, changes saved.")
+
+
+def text_field(request, key):
+    # names and queries are strings; a number or list there is a bad request, not a crash
+    value = request[key]
+    if not isinstance(value, str):
+        raise TypeError(f"'{key}' must be a string")
+    return value
+
+
+def book_json(book_id, book):
+    return {"book_id": book_id, "name": book['name'], "author": book['author'], "quantity": book['quantity']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the library over TCP as JSON lines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="seconds between writes of the changes made by clients")
+    parser.add_argument("--journal", action="store_true", help="append changes to the journal")
+    parser.add_argument("--binary", action="store_true", help="use the memory mapped binary data files")
+    parser.add_argument("--storage", choices=["text", "binary", "sqlite"], default="text")
+    parser.add_argument("--data", default="library_data.txt", help="books file or sqlite database")
+    args = parser.parse_args()
+
+    library = Library(args.data, journal_mode=args.journal, binary=args.binary, storage=args.storage)
+    asyncio.run(LibraryServer(library, args.flush_interval).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
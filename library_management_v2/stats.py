@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from safe_files import atomic_write
+
+# upper bounds of the latency histogram buckets in milliseconds; the last bucket has no bound
+BUCKETS_MS = (0.01, 0.1, 1, 10, 100, 1000)
+
+# Library methods that are timed while stats are on; generators are left out because calling one only
+# creates it
+TIMED_METHODS = (
+    "load_books", "load_students", "load_rentals", "save_books", "save_students", "save_rentals",
+    "save_files", "merge_disk_changes", "write_journal", "compact_journal", "flush",
+    "new_book", "remove_book", "search_book", "search_books_by_text", "add_student", "delete_student",
+    "search_student_by_name", "print_books", "display_students", "display_rentals",
+    "add_rental", "return_rental", "rental_batch", "rental_batch_csv", "search_rentals", "search_book_holders",
+    "import_books", "import_students", "export", "print_inventory_report",
+    "renew_rental", "rentals_due_between", "overdue_rentals", "rentals_due_this_week", "print_due_rentals",
+)
+
+# storage methods whose file sizes are counted as bytes read or written
+STORAGE_IO = {
+    "load_books": ("read", "books"), "load_students": ("read", "students"), "load_rentals": ("read", "rentals"),
+    "save_books": ("written", "books"), "save_students": ("written", "students"),
+    "save_rentals": ("written", "rentals"),
+}
+
+
+class LibraryStats:
+    # call counts and latency histograms per method, bytes read and written per file and records
+    # scanned per lookup; collected only for a Library that has stats enabled
+    def __init__(self):
+        self.started = time.time()
+        self.calls = {}
+        self.bytes = {"read": {}, "written": {}}
+        self.scans = {}
+        # the periodic dump reads from another thread
+        self.lock = threading.Lock()
+        self.dump_thread = None
+
+    def record_call(self, name, seconds):
+        milliseconds = seconds * 1000
+        with self.lock:
+            if name not in self.calls:
+                self.calls[name] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                    "histogram": [0] * (len(BUCKETS_MS) + 1)}
+            call = self.calls[name]
+            call["count"] += 1
+            call["total_ms"] += milliseconds
+            call["max_ms"] = max(call["max_ms"], milliseconds)
+            bucket = 0
+            while bucket < len(BUCKETS_MS) and milliseconds > BUCKETS_MS[bucket]:
+                bucket += 1
+            call["histogram"][bucket] += 1
+
+    def record_bytes(self, direction, path, count):
+        with self.lock:
+            totals = self.bytes[direction]
+            totals[path] = totals.get(path, 0) + count
+
+    def record_scan(self, lookup, records):
+        with self.lock:
+            if lookup not in self.scans:
+                self.scans[lookup] = {"lookups": 0, "records": 0, "max": 0}
+            scan = self.scans[lookup]
+            scan["lookups"] += 1
+            scan["records"] += records
+            scan["max"] = max(scan["max"], records)
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps({
+                "uptime_seconds": round(time.time() - self.started, 3),
+                "histogram_buckets_ms": list(BUCKETS_MS),
+                "calls": self.calls,
+                "bytes": self.bytes,
+                "records_scanned": self.scans,
+            }))
+
+    def report_lines(self):
+        snapshot = self.snapshot()
+        bucket_names = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        lines = [f"{'method':>24} {'calls':>8} {'mean ms':>10} {'max ms':>10}  histogram ({' '.join(bucket_names)})"]
+        for name, call in sorted(snapshot["calls"].items()):
+            lines.append(f"{name:>24} {call['count']:>8} {call['total_ms'] / call['count']:>10.3f} "
+                         f"{call['max_ms']:>10.3f}  {' '.join(map(str, call['histogram']))}")
+        for direction in ("read", "written"):
+            for path, count in sorted(snapshot["bytes"][direction].items()):
+                lines.append(f"Bytes {direction} {path}: {count}")
+        for lookup, scan in sorted(snapshot["records_scanned"].items()):
+            lines.append(f"Records scanned by {lookup}: {scan['records'] / scan['lookups']:.1f} per lookup, "
+                         f"max {scan['max']} ({scan['lookups']} lookups)")
+        return lines
+
+    def dump(self, path):
+        with atomic_write(path) as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def start_dump(self, path, interval):
+        # write the snapshot to path every interval seconds until the program exits
+        def dump_periodically():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+        self.dump_thread = threading.Thread(target=dump_periodically, daemon=True)
+        self.dump_thread.start()
+
+
+def timed(stats, name, method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.record_call(name, time.perf_counter() - start)
+    return wrapper
+
+
+def counted_io(stats, storage, direction, name, method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        result = method(*args, **kwargs)
+        # memory mapped files count their whole size as read
+        path = storage.data_path(name)
+        if path is not None and os.path.isfile(path):
+            stats.record_bytes(direction, path, os.path.getsize(path))
+        return result
+    return wrapper
+
+
+def enable_stats(library, stats=None):
+    # the timing wrappers are set on the instance only, so a Library without stats runs the plain methods
+    stats = stats or LibraryStats()
+    library.stats = stats
+    for name in TIMED_METHODS:
+        setattr(library, name, timed(stats, name, getattr(library, name)))
+    for name, (direction, file_name) in STORAGE_IO.items():
+        setattr(library.storage, name, counted_io(stats, library.storage, direction, file_name,
+                                                  getattr(library.storage, name)))
+    return stats
+
+
+def disable_stats(library):
+    for name in TIMED_METHODS:
+        library.__dict__.pop(name, None)
+    for name in STORAGE_IO:
+        library.storage.__dict__.pop(name, None)
+    library.stats = None
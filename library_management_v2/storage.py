@@ -0,0 +1,391 @@
+import argparse
+import itertools
+import os
+import sqlite3
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+
+from binary_store import BOOKS, STUDENTS, MappedRecords, write_records
+from chunked_loader import load_records, paused_gc
+from records import Book
+from safe_files import FileLock, atomic_write, file_version
+
+
+class TextStorage:
+    # the comma separated books, students and rentals files; every save rewrites a whole file
+    row_updates = False
+    # lazy storages decode records on access, so Library avoids building full indexes up front
+    lazy = False
+    # storages with their own indexes answer title and name lookups themselves
+    indexed_search = False
+
+    def __init__(self, file_path, workers=None):
+        self.directory = os.path.dirname(file_path)
+        self.paths = {"books": file_path, "students": self.path("students.txt"), "rentals": self.path("rentals.txt")}
+        self.journal_path = self.path("library_journal.txt")
+        self.lock = FileLock(self.path("library.lock"))
+        self.file_versions = {}
+        # processes used to parse large files, one per core by default
+        self.workers = workers
+        # (line number, line, reason) of the lines skipped by the last load of each file
+        self.bad_lines = {}
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def create_files(self):
+        for path in self.paths.values():
+            if not os.path.isfile(path):
+                open(path, "w").close()
+
+    def data_path(self, name):
+        return self.paths[name]
+
+    def changed_on_disk(self, name):
+        # true when another process replaced the file since it was last read or written here
+        return file_version(self.paths[name]) != self.file_versions.get(name)
+
+    def last_book_id(self, book_dict):
+        return max(book_dict.keys(), default=0)
+
+    def read_records(self, name):
+        # parsed rows of one data file; lines that cannot be parsed are reported and skipped
+        path = self.paths[name]
+        while True:
+            version = file_version(path)
+            if version is None:
+                self.file_versions[name] = None
+                return []
+            rows, bad_lines = load_records(path, name, self.workers)
+            # large files are read by several processes, so read again if the file was replaced meanwhile
+            if file_version(path) == version:
+                break
+        self.file_versions[name] = version
+        self.bad_lines[name] = bad_lines
+        for line_number, line, reason in bad_lines[:20]:
+            print(f"Ignoring line {line_number} in '{path}': {line}. It does not contain valid data ({reason}).")
+        if len(bad_lines) > 20:
+            print(f"... and {len(bad_lines) - 20} more invalid lines in '{path}'.")
+        return itertools.chain.from_iterable(rows)
+
+    def load_books(self):
+        with paused_gc():
+            # create a record in book_dict w/ book_id as key
+            return {book_id: Book(name, author, quantity)
+                    for book_id, name, author, quantity in self.read_records("books")}
+
+    def save_books(self, book_dict):
+        with atomic_write(self.paths["books"]) as file:
+            # goes through each key value pair in the book_dict
+            for book_id, info in book_dict.items():
+                # write line to the file with the book information
+                file.write(f"{book_id},{info['name']},{info['author']},{info['quantity']}\n")
+        self.file_versions["books"] = file_version(self.paths["books"])
+
+    def load_students(self):
+        with paused_gc():
+            return dict(self.read_records("students"))
+
+    def save_students(self, student_dict):
+        with atomic_write(self.paths["students"]) as file:
+            # iterate over each key value pair in the student_dict
+            for student_id, name in student_dict.items():
+                # write a line to the file w/ student information
+                file.write(f"{name},{student_id}\n")
+        self.file_versions["students"] = file_version(self.paths["students"])
+
+    def load_rentals(self):
+        # returns (student_name, student_id, book_id, rented, due) rows, the dates as YYYY-MM-DD or ""
+        return self.read_records("rentals")
+
+    def save_rentals(self, rentals_dict, rental_dates):
+        with atomic_write(self.paths["rentals"]) as file:
+            # iterate over each rental entry in the rental_dict
+            for student_key, book_ids in rentals_dict.items():
+                # extract the student name and ID from the dictionary key
+                student_name, student_id = student_key
+                # write a line for each rental entry w/ the information, and its dates when it has them
+                for book_id in book_ids:
+                    dates = rental_dates.get((student_name, student_id, book_id))
+                    if dates:
+                        file.write(f"{student_name},{student_id},{book_id},{dates[0] or ''},{dates[1]}\n")
+                    else:
+                        file.write(f"{student_name},{student_id},{book_id}\n")
+        self.file_versions["rentals"] = file_version(self.paths["rentals"])
+
+
+class BinaryStorage(TextStorage):
+    # books and students in memory mapped binary files (see binary_store.py), rentals stay text
+    lazy = True
+
+    def __init__(self, file_path, workers=None):
+        super().__init__(file_path, workers)
+        self.binary_paths = {"books": os.path.splitext(file_path)[0] + ".bin", "students": self.path("students.bin")}
+
+    def create_files(self):
+        if not os.path.isfile(self.paths["rentals"]):
+            open(self.paths["rentals"], "w").close()
+
+    def data_path(self, name):
+        return self.binary_paths.get(name, self.paths[name])
+
+    def changed_on_disk(self, name):
+        # mapped files are not merged between processes
+        return name == "rentals" and super().changed_on_disk(name)
+
+    def last_book_id(self, book_dict):
+        return book_dict.last_key(default=0)
+
+    def load_books(self):
+        return MappedRecords(self.binary_paths["books"], BOOKS)
+
+    def save_books(self, book_dict):
+        write_records(self.binary_paths["books"], BOOKS, book_dict.items())
+
+    def load_students(self):
+        return MappedRecords(self.binary_paths["students"], STUDENTS)
+
+    def save_students(self, student_dict):
+        write_records(self.binary_paths["students"], STUDENTS, student_dict.items())
+
+
+class SQLiteBooks(MutableMapping):
+    # book_dict backed by the books table; rows read are cached until the next commit so changes
+    # made through book['quantity'] stay visible until Library writes them
+    def __init__(self, connection):
+        self.connection = connection
+        self.cache = {}
+
+    def __getitem__(self, book_id):
+        if book_id in self.cache:
+            return self.cache[book_id]
+        row = self.connection.execute("SELECT name, author, quantity FROM books WHERE book_id = ?",
+                                      (book_id,)).fetchone()
+        if row is None:
+            raise KeyError(book_id)
+        self.cache[book_id] = Book(*row)
+        return self.cache[book_id]
+
+    def __setitem__(self, book_id, book):
+        self.connection.execute("INSERT OR REPLACE INTO books VALUES (?, ?, ?, ?)",
+                                (book_id, book['name'], book['author'], book['quantity']))
+        self.cache[book_id] = book
+
+    def __delitem__(self, book_id):
+        self.cache.pop(book_id, None)
+        if self.connection.execute("DELETE FROM books WHERE book_id = ?", (book_id,)).rowcount == 0:
+            raise KeyError(book_id)
+
+    def __contains__(self, book_id):
+        return book_id in self.cache or self.connection.execute(
+            "SELECT 1 FROM books WHERE book_id = ?", (book_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.connection.execute("SELECT book_id FROM books ORDER BY book_id"):
+            yield row[0]
+
+    def items(self):
+        for book_id, name, author, quantity in self.connection.execute(
+                "SELECT book_id, name, author, quantity FROM books ORDER BY book_id"):
+            yield book_id, self.cache.get(book_id) or Book(name, author, quantity)
+
+
+class SQLiteStudents(MutableMapping):
+    # student_dict backed by the students table
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __getitem__(self, student_id):
+        row = self.connection.execute("SELECT name FROM students WHERE student_id = ?", (student_id,)).fetchone()
+        if row is None:
+            raise KeyError(student_id)
+        return row[0]
+
+    def __setitem__(self, student_id, name):
+        self.connection.execute("INSERT OR REPLACE INTO students VALUES (?, ?)", (student_id, name))
+
+    def __delitem__(self, student_id):
+        if self.connection.execute("DELETE FROM students WHERE student_id = ?", (student_id,)).rowcount == 0:
+            raise KeyError(student_id)
+
+    def __contains__(self, student_id):
+        return self.connection.execute("SELECT 1 FROM students WHERE student_id = ?",
+                                       (student_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.connection.execute("SELECT student_id FROM students ORDER BY student_id"):
+            yield row[0]
+
+    def items(self):
+        yield from self.connection.execute("SELECT student_id, name FROM students ORDER BY student_id")
+
+
+class SQLiteStorage:
+    # an indexed sqlite database; each change is a single row statement and saves are commits
+    row_updates = True
+    lazy = True
+    indexed_search = True
+    journal_path = None
+
+    def __init__(self, file_path, workers=None):
+        # workers is not used, the database reads rows when they are asked for
+        if not file_path.endswith((".db", ".sqlite")):
+            file_path = os.path.splitext(file_path)[0] + ".db"
+        self.path = file_path
+        self.lock = nullcontext()
+        self.connection = sqlite3.connect(file_path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS books (
+                book_id INTEGER PRIMARY KEY, name TEXT NOT NULL, author TEXT NOT NULL, quantity INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS books_name ON books (lower(name));
+            CREATE INDEX IF NOT EXISTS books_author ON books (lower(author));
+            CREATE TABLE IF NOT EXISTS students (student_id TEXT PRIMARY KEY, name TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS students_name ON students (lower(name));
+            CREATE TABLE IF NOT EXISTS rentals (
+                student_name TEXT NOT NULL, student_id TEXT NOT NULL, book_id INTEGER NOT NULL,
+                rented_on TEXT, due_on TEXT, PRIMARY KEY (student_id, student_name, book_id));
+            CREATE INDEX IF NOT EXISTS rentals_book ON rentals (book_id);
+        """)
+        # databases made before rentals had due dates get the date columns added
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(rentals)")]
+        if "due_on" not in columns:
+            self.connection.execute("ALTER TABLE rentals ADD COLUMN rented_on TEXT")
+            self.connection.execute("ALTER TABLE rentals ADD COLUMN due_on TEXT")
+            self.connection.commit()
+        self.books = SQLiteBooks(self.connection)
+        self.data_versions = {}
+
+    def create_files(self):
+        pass
+
+    def data_path(self, name):
+        # rows are read and written inside the one database file, not per kind of data
+        return None
+
+    def changed_on_disk(self, name):
+        # true when another connection committed since the data was loaded or this was last asked;
+        # sqlite moves data_version on every commit made by another connection
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        changed = self.data_versions.get(name, version) != version
+        self.data_versions[name] = version
+        return changed
+
+    def last_book_id(self, book_dict):
+        return self.connection.execute("SELECT COALESCE(MAX(book_id), 0) FROM books").fetchone()[0]
+
+    def load_books(self):
+        self.data_versions["books"] = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        return self.books
+
+    def load_students(self):
+        return SQLiteStudents(self.connection)
+
+    def load_rentals(self):
+        return self.connection.execute("SELECT student_name, student_id, book_id, rented_on, due_on "
+                                       "FROM rentals").fetchall()
+
+    def save_books(self, book_dict):
+        # full replacement, used when migrating from another storage
+        if book_dict is not self.books:
+            self.connection.execute("DELETE FROM books")
+            self.connection.executemany("INSERT INTO books VALUES (?, ?, ?, ?)",
+                                        ((book_id, book['name'], book['author'], book['quantity'])
+                                         for book_id, book in book_dict.items()))
+        self.commit()
+
+    def save_students(self, student_dict):
+        if not isinstance(student_dict, SQLiteStudents):
+            self.connection.execute("DELETE FROM students")
+            self.connection.executemany("INSERT INTO students VALUES (?, ?)", student_dict.items())
+        self.commit()
+
+    def save_rentals(self, rentals_dict, rental_dates):
+        self.connection.execute("DELETE FROM rentals")
+        self.connection.executemany("INSERT OR IGNORE INTO rentals VALUES (?, ?, ?, ?, ?)",
+                                    ((student_name, student_id, book_id)
+                                     + tuple(str(day) if day else None for day in
+                                             rental_dates.get((student_name, student_id, book_id), (None, None)))
+                                     for (student_name, student_id), book_ids in rentals_dict.items()
+                                     for book_id in book_ids))
+        self.commit()
+
+    def write_records(self, records):
+        # apply Library change records as single row statements inside the open transaction;
+        # sqlite keeps the prepared statement for each of these fixed queries
+        execute = self.connection.execute
+        for record in records:
+            action = record[0]
+            if action == "book":
+                execute("INSERT OR REPLACE INTO books VALUES (?, ?, ?, ?)", record[1:5])
+            elif action == "delete_book":
+                execute("DELETE FROM books WHERE book_id = ?", record[1:2])
+            elif action == "student":
+                execute("INSERT OR REPLACE INTO students VALUES (?, ?)", record[1:3])
+            elif action == "delete_student":
+                execute("DELETE FROM students WHERE student_id = ?", record[1:2])
+            elif action == "rent":
+                dates = tuple(day or None for day in record[4:6]) or (None, None)
+                execute("INSERT OR REPLACE INTO rentals VALUES (?, ?, ?, ?, ?)", tuple(record[1:4]) + dates)
+            elif action == "renew":
+                execute("UPDATE rentals SET due_on = ? WHERE student_name = ? AND student_id = ? AND book_id = ?",
+                        (record[4],) + tuple(record[1:4]))
+            elif action == "return":
+                execute("DELETE FROM rentals WHERE student_name = ? AND student_id = ? AND book_id = ?", record[1:4])
+
+    def commit(self):
+        self.connection.commit()
+        self.books.cache.clear()
+
+    def find_title(self, name):
+        row = self.connection.execute("SELECT book_id FROM books WHERE lower(name) = ? ORDER BY book_id LIMIT 1",
+                                      (name.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def find_students(self, name):
+        # (student_id, name) of every student with the name, any case
+        return self.connection.execute("SELECT student_id, name FROM students WHERE lower(name) = ? "
+                                       "ORDER BY student_id", (name.lower(),)).fetchall()
+
+
+STORAGES = {"text": TextStorage, "binary": BinaryStorage, "sqlite": SQLiteStorage}
+
+
+def open_storage(kind, file_path, workers=None):
+    if kind not in STORAGES:
+        raise ValueError(f"Unknown storage '{kind}'. Use one of: {', '.join(STORAGES)}.")
+    return STORAGES[kind](file_path, workers)
+
+
+def migrate(source, target):
+    # copy books, students and rentals from one storage to another
+    rentals_dict = {}
+    rental_dates = {}
+    for student_name, student_id, book_id, rented, due in source.load_rentals():
+        rentals_dict.setdefault((student_name, student_id), set()).add(book_id)
+        if due:
+            rental_dates[(student_name, student_id, book_id)] = (rented, due)
+    target.save_books(source.load_books())
+    target.save_students(source.load_students())
+    target.save_rentals(rentals_dict, rental_dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the library data from one storage to another")
+    parser.add_argument("source", help="books file or database to read, e.g. library_data.txt")
+    parser.add_argument("target", help="books file or database to write, e.g. library.db")
+    parser.add_argument("--source-storage", choices=STORAGES, default="text")
+    parser.add_argument("--target-storage", choices=STORAGES, default="sqlite")
+    args = parser.parse_args()
+
+    migrate(open_storage(args.source_storage, args.source), open_storage(args.target_storage, args.target))
+    print(f"Migrated '{args.source}' ({args.source_storage}) to '{args.target}' ({args.target_storage}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# the modules are run as scripts from library_management_v2 and import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "library_management_v2"))
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    # a small library in a temporary directory, returns the path of the books file
+    (tmp_path / "library_data.txt").write_text("1,Harry Potter,JK Rowling,5\n2,The Hobbit,Tolkien,3\n"
+                                               "3,Dune,Frank Herbert,2\n")
+    (tmp_path / "students.txt").write_text("James Lee,101\nAnna Smith,102\n")
+    (tmp_path / "rentals.txt").write_text("James Lee,101,1\n")
+    return str(tmp_path / "library_data.txt")
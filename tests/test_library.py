@@ -0,0 +1,75 @@
+from library import Library
+
+
+def test_two_processes_merge_their_changes(data_path):
+    first = Library(data_path)
+    second = Library(data_path)
+    first.new_book("Emma", "Jane Austen", 4)
+    second.add_rental("Anna Smith", "102", 2)
+    first.add_rental("James Lee", "101", 2)
+    second.add_student("Tom Hill", "103")
+
+    reopened = Library(data_path)
+    assert reopened.find_title("Emma") is not None
+    # both rentals took a copy of the same book
+    assert reopened.book_dict[2]['quantity'] == 1
+    assert sorted(reopened.rented_books("101")) == [1, 2]
+    assert reopened.rented_books("102") == [2]
+    assert reopened.student_dict["103"] == "Tom Hill"
+
+
+def test_merge_keeps_search_index_and_aggregates_up_to_date(data_path):
+    first = Library(data_path)
+    second = Library(data_path)
+    # build the text indexes and aggregates before the other process writes
+    assert [book_id for book_id, score in first.search_books_by_text("name", "dune")] == [3]
+    first.author_totals()
+    second.new_book("Dune Messiah", "Frank Herbert", 3)
+    second.remove_book(2, 3)
+    # saving here merges the files written by the other process
+    first.add_rental("Anna Smith", "102", 1)
+
+    found = [book_id for book_id, score in first.search_books_by_text("name", "messiah")]
+    assert found == [first.find_title("Dune Messiah")]
+    assert first.search_books_by_text("name", "hobbit") == []
+    totals = {author: (titles, copies) for author, titles, copies in first.author_totals()}
+    assert totals["Frank Herbert"] == (2, 5)
+    assert totals["JK Rowling"] == (1, 4)
+    assert "Tolkien" not in totals
+    assert first.top_students() == [("101", 1), ("102", 1)]
+
+
+def test_journal_is_replayed_on_load(data_path):
+    library = Library(data_path, journal_mode=True)
+    library.new_book("Emma", "Jane Austen", 4)
+    library.add_rental("Anna Smith", "102", 3)
+    library.return_rental("James Lee", "101", 1)
+
+    reopened = Library(data_path, journal_mode=True)
+    assert reopened.book_dict[reopened.find_title("Emma")]['quantity'] == 4
+    assert reopened.book_dict[3]['quantity'] == 1
+    assert reopened.rented_books("102") == [3]
+    assert reopened.rented_books("101") == []
+
+
+def test_compaction_keeps_journal_of_other_process(data_path):
+    first = Library(data_path, journal_mode=True)
+    second = Library(data_path, journal_mode=True)
+    second.add_rental("Anna Smith", "102", 2)
+    first.new_book("Emma", "Jane Austen", 4)
+    first.compact_journal()
+
+    reopened = Library(data_path)
+    assert reopened.find_title("Emma") is not None
+    assert reopened.rented_books("102") == [2]
+    assert reopened.book_dict[2]['quantity'] == 2
+
+
+def test_return_of_removed_book_is_saved(data_path):
+    library = Library(data_path)
+    library.remove_book(1, 5)
+    assert library.return_rental("James Lee", "101", 1)
+
+    reopened = Library(data_path)
+    assert reopened.rented_books("101") == []
+    assert 1 not in reopened.book_dict
@@ -0,0 +1,34 @@
+import random
+
+from search_index import SearchIndex, edit_distance
+
+
+def test_edit_distance_counts_a_swap_as_one_edit():
+    assert edit_distance("histroy", "history", 2) == 1
+    assert edit_distance("kitten", "sitting", 3) == 3
+    # optimal string alignment does not edit a swapped pair again
+    assert edit_distance("ca", "abc", 3) == 3
+    assert edit_distance("abc", "xyz", 1) == 2
+
+
+def test_search_ranks_exact_prefix_and_typo_matches():
+    index = SearchIndex()
+    index.add_many([(1, "The History of Rome"), (2, "Historical Fiction"), (3, "Cooking at Home")])
+    assert [doc_id for doc_id, score in index.search("history")] == [1]
+    # a prefix ranks the shorter word first
+    assert [doc_id for doc_id, score in index.search("histor")] == [1, 2]
+    assert [doc_id for doc_id, score in index.search("histroy")] == [1]
+    assert index.search("history", 0) == []
+
+
+def test_search_limit_returns_the_best_of_the_full_ranking():
+    # the search stops once no other document can beat the ones found, so a small limit must give
+    # the same books as the start of a search that ranks everything
+    random.seed(7)
+    words = ["alpha", "alps", "beta", "bet", "gamma", "game", "delta", "del", "omega", "mega"]
+    index = SearchIndex()
+    index.add_many((doc_id, " ".join(random.sample(words, 3))) for doc_id in range(500))
+    for query in ["al", "bet", "game", "mega del", "a", "gama", "omega beta"]:
+        everything = index.search(query, 500)
+        for limit in (1, 5, 20):
+            assert index.search(query, limit) == everything[:limit]